@@ -3,16 +3,72 @@
 Created on Mon Dec  5 17:23:06 2022
 
 @author: icyveins7 
+
+Performance notes
+-----------------
+Bulk inserts are bound by sqlite itself (binding values and stepping each statement),
+not by Python, so spreading inserts over threads or processes does not help.
+What does help, roughly in order of impact:
+    1) Do many inserts in one transaction i.e. commit once at the end (commitNow=False,
+       or use Database.transaction()), instead of committing every row.
+    2) Relax durability for bulk loads e.g. synchronous=OFF (see SqliteContainer.fastWritePragmas),
+       or Database.bulkInsertContext() for one-off loads.
+    3) Reuse statements: TableProxy caches its insert statements, and insertMany/insertNumpy
+       bind many rows per multi-row statement.
+    4) For numpy data, use insertNumpy(), which converts whole arrays at once.
+    5) If the rows can be computed from a counter, TableProxy.insertRange() generates them
+       inside sqlite, so no Python objects are created at all. This saves memory, although
+       the recursive counter is not faster than insertNumpy() on existing arrays.
 """
 
 import sqlite3 as sq
-import re
+import sys
+import os
+import threading
+import queue
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+from itertools import islice, chain
+from operator import itemgetter
 
 from .formatSpec import FormatSpecifier
 
 #%% Basic container, the most barebones
 class SqliteContainer:
-    def __init__(self, dbpath: str, row_factory: type=sq.Row, pragma_foreign_keys: bool=True):
+    # Suggested pragmas for bulk write workloads; pass these in via the pragmas argument.
+    # Note that synchronous=OFF trades durability on power loss for speed.
+    fastWritePragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "temp_store": "MEMORY",
+        "cache_size": -65536 # Negative values are in KiB i.e. 64 MiB
+    }
+    # Size of sqlite3's per-connection prepared statement cache (the module default is 128).
+    # Every table has its own insert statements, plus the multi-row batch variants.
+    # Each cached statement costs a few KB; set this on a subclass (or before connecting) to change it.
+    cachedStatements = 512
+    # Seconds a connection waits on a locked database before raising SQLITE_BUSY.
+    # Matters once several connections write (see threadConnection and executeAsync)
+    busyTimeout = 5.0
+    # Maximum number of statements the executeAsync() writer commits in one transaction
+    asyncBatchSize = 1000
+    # Page size for new database files; larger pages mean shallower b-trees and fewer pages
+    # touched per insert for wide numeric rows (sqlite's default is 4096)
+    defaultPageSize = 16384
+    # Applied by default to file databases (not in-memory ones).
+    # WAL needs a single fsync per commit instead of the rollback journal's two, and lets readers
+    # continue during writes; synchronous=NORMAL is still safe against application crashes in WAL mode.
+    defaultFilePragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -20000, # 20 MB
+        "mmap_size": 268435456 # 256 MiB
+    }
+
+    def __init__(self, dbpath: str, row_factory: type=sq.Row, pragma_foreign_keys: bool=True,
+                 pragmas: dict=None, journal_mode: str=None, synchronous: str=None,
+                 cache_size_kib: int=None, page_size: int=None, default_pragmas: bool=True):
         '''
         Instantiates an sqlite database container.
 
@@ -23,16 +79,409 @@ class SqliteContainer:
             See sqlite3.connect() for more information.
         row_factory : type, optional
             The row factory for the sqlite3 connection. The default is the in-built sqlite3.Row.
+            This only applies to fetched rows, so it has no cost for inserts.
+            Use None for plain tuples, which avoids allocating a Row object per
+            fetched row when named access is not needed.
         pragma_foreign_keys : bool, optional
             Turns on PRAGMA FOREIGN_KEYS. The default is True.
+        pragmas : dict, optional
+            Additional pragmas to issue right after connecting, as a dictionary of
+            pragma name -> value. These are issued last, so they override everything else.
+            See SqliteContainer.fastWritePragmas for a set of pragmas suited to bulk inserts.
+            The default is None.
+        journal_mode : str, optional
+            PRAGMA journal_mode. The default is None, which uses WAL for newly created file databases
+            (see SqliteContainer.defaultFilePragmas) and leaves existing files and in-memory databases alone.
+            Note that WAL mode is persistent in the database file. Use False to never switch the journal mode.
+        synchronous : str, optional
+            PRAGMA synchronous. The default is None, which uses NORMAL for file databases
+            and leaves in-memory databases alone.
+        cache_size_kib : int, optional
+            Page cache size in KiB. The default is None, which uses about 20 MB
+            for file databases and leaves in-memory databases alone.
+        page_size : int, optional
+            Page size in bytes for newly created database files. This can only be set
+            before anything is written (and not at all once in WAL mode), so it is ignored
+            for existing files. The default is None, which uses SqliteContainer.defaultPageSize.
+        default_pragmas : bool, optional
+            Applies SqliteContainer.defaultFilePragmas (and the default page size) to file databases.
+            Use False to only issue the pragmas that are explicitly passed in. The default is True.
         '''
+        # Check before connecting, since connecting creates the file
+        isNewFile = dbpath not in (":memory:", "") and (
+            not os.path.exists(dbpath) or os.path.getsize(dbpath) == 0)
         self.dbpath = dbpath
-        self.con = sq.connect(dbpath)
-        self.con.row_factory = row_factory
+        self._row_factory = row_factory
+        self._pragma_foreign_keys = pragma_foreign_keys
+        self.con = self._connect()
         self.cur = self.con.cursor()
+        # Extra connections for other threads, see threadConnection()
+        self._ownerThread = threading.get_ident()
+        self._local = threading.local()
+        self._threadConnections = list()
+        self._threadConnectionsLock = threading.Lock()
+        # Background writer, see executeAsync()
+        self._writeq = queue.Queue()
+        self._writer = None
+        self._writerLock = threading.Lock()
+        self._asyncError = None
+        # Bumped whenever rows cached from self.con may be stale without total_changes moving,
+        # i.e. on rollbacks and on writes from other connections (see MetaTableProxy.getMetadataFor)
+        self._cacheGeneration = 0
+
+        # Only PRAGMA optimize databases we created on exit, see __exit__()
+        self.optimizeOnExit = isNewFile
+
+        # Journal/sync tuning only makes sense on disk; explicit arguments are always honoured.
+        # The page size must come first, before the journal mode is switched to WAL
+        initialPragmas = dict()
+        if default_pragmas:
+            if isNewFile:
+                initialPragmas["page_size"] = self.defaultPageSize
+            if dbpath not in (":memory:", ""):
+                initialPragmas.update(self.defaultFilePragmas)
+                if not isNewFile:
+                    # The journal mode is stored in the file, so don't silently convert existing databases
+                    # (this would also fail for read-only ones)
+                    del initialPragmas["journal_mode"]
+        if page_size is not None and isNewFile:
+            initialPragmas["page_size"] = page_size
+        if journal_mode is False:
+            initialPragmas.pop("journal_mode", None)
+        elif journal_mode is not None:
+            initialPragmas["journal_mode"] = journal_mode
+        if synchronous is not None:
+            initialPragmas["synchronous"] = synchronous
+        if cache_size_kib is not None:
+            initialPragmas["cache_size"] = -cache_size_kib # Negative values are in KiB
+        if pragmas is not None:
+            initialPragmas.update(pragmas)
+
+        # Switching the journal mode writes to the file, so it is issued on its own, last
+        journalMode = initialPragmas.pop("journal_mode", None)
+        if len(initialPragmas) > 0:
+            self._applyPragmas(initialPragmas)
+        if journalMode is not None:
+            try:
+                self.con.execute(f"PRAGMA journal_mode={journalMode}")
+            except sq.OperationalError:
+                # Only the default may be skipped, e.g. for an empty read-only file
+                if journal_mode is not None or "journal_mode" in (pragmas or {}):
+                    raise
+        # The page size is stored in the file; everything else must be repeated per connection
+        self._connectionPragmas = {
+            k: v for k, v in initialPragmas.items() if k != "page_size"}
+
+    def _connect(self, **kwargs):
+        '''
+        Opens a new connection to the database with the container's settings.
+        Any kwargs are passed on to sqlite3.connect().
+        '''
+        connectKwargs = dict(cached_statements=self.cachedStatements, timeout=self.busyTimeout)
+        if sys.version_info >= (3, 12):
+            # Pin the legacy (implicit BEGIN) transaction handling that commitNow relies on,
+            # in case the default changes in future python versions
+            connectKwargs['autocommit'] = sq.LEGACY_TRANSACTION_CONTROL
+        connectKwargs.update(kwargs)
+        con = sq.connect(self.dbpath, **connectKwargs)
+        con.row_factory = self._row_factory
+        if self._pragma_foreign_keys:
+            con.execute("PRAGMA foreign_keys=ON")
+        return con
+
+    def _applyPragmas(self, pragmas: dict, con: sq.Connection=None):
+        '''
+        Issues all the pragmas in a single script.
+
+        Parameters
+        ----------
+        pragmas : dict
+            Dictionary of pragma name -> value.
+        con : sq.Connection, optional
+            The connection to issue them on. The default is None, which uses self.con.
+        '''
+        (self.con if con is None else con).executescript(
+            "".join(f"PRAGMA {k}={v};" for k, v in pragmas.items())
+        )
+
+    def threadConnection(self):
+        '''
+        Returns a connection to the database for the calling thread.
+
+        sqlite3 connections may only be used by the thread that created them, so
+        this lazily opens (and then reuses) one connection per thread, with the same
+        settings and pragmas as the main connection. In the thread that created
+        this container, the main connection (self.con) is returned.
+
+        This is mainly for concurrent reads on file databases: in WAL mode
+        (the default for files) readers do not block each other or the writer.
+        Note that each connection has its own transactions, so rows written via the
+        main connection are only visible to other threads once committed.
+
+        Example:
+            def work(d):
+                return d.threadConnection().execute("select * from mytable").fetchall()
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(work, [d]*4))
+
+        Returns
+        -------
+        con : sq.Connection
+            The connection for the calling thread.
+        '''
+        if threading.get_ident() == self._ownerThread:
+            return self.con
+
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            # Allow closeThreadConnections() to close it from the owner thread
+            con = self._local.con = self._connectExtra(check_same_thread=False)
+            with self._threadConnectionsLock:
+                self._threadConnections.append(con)
+        return con
+
+    def _connectExtra(self, **kwargs):
+        '''
+        Opens an additional connection to a file database, with the same pragmas as the main connection.
+        '''
+        if self.dbpath in (":memory:", ""):
+            raise ValueError("In-memory databases are private to their connection; use a file database to access it from other threads.")
+        con = self._connect(**kwargs)
+        if len(self._connectionPragmas) > 0:
+            self._applyPragmas(self._connectionPragmas, con)
+        return con
+
+    def executeAsync(self, sql: str, params=()):
+        '''
+        Queues a write statement to be executed by a background writer thread,
+        and returns immediately.
+
+        The writer has its own connection. It drains whatever is queued (up to asyncBatchSize
+        statements) into a single transaction, so many small writes cost one commit
+        instead of one each. This trades latency for throughput, and lets many producer threads
+        write without contending for the sqlite write lock.
+
+        Statements are executed in the order they were queued, but are only visible to other
+        connections (including self.con) once their batch is committed; call flushAsync() to wait for that.
+        If a statement fails, its whole batch is rolled back and the error is raised by the next flushAsync().
+        Only file databases are supported.
+
+        Parameters
+        ----------
+        sql : str
+            The statement to execute.
+        params : sequence or dict, optional
+            The parameters to bind. The default is ().
+        '''
+        # Producers may race to start the writer, or with stopAsyncWriter();
+        # nothing may be queued after its stop sentinel, or flushAsync() would never return
+        with self._writerLock:
+            if self._writer is None:
+                # Open the connection here so that errors surface in the caller
+                con = self._connectExtra(check_same_thread=False)
+                self._writer = threading.Thread(target=self._writerLoop, args=(con,), daemon=True)
+                self._writer.start()
+            self._writeq.put((sql, params))
+
+    def _writerLoop(self, con: sq.Connection):
+        while True:
+            item = self._writeq.get()
+            batch = [item]
+            while item is not None and len(batch) < self.asyncBatchSize:
+                try:
+                    item = self._writeq.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            try:
+                con.execute("BEGIN")
+                for item in batch:
+                    if item is None:
+                        break
+                    con.execute(*item)
+                con.commit()
+            except Exception as e:
+                con.rollback()
+                if self._asyncError is None:
+                    self._asyncError = e
+            finally:
+                # Before task_done(), so caches are already invalidated when flushAsync() returns
+                self._cacheGeneration += 1
+                for _ in batch:
+                    self._writeq.task_done()
+
+            if batch[-1] is None: # Stop sentinel
+                con.close()
+                return
+
+    def flushAsync(self):
+        '''
+        Blocks until every statement queued by executeAsync() has been committed.
+        Re-raises the first error from the writer thread, if there was one.
+        '''
+        self._writeq.join()
+        if self._asyncError is not None:
+            e, self._asyncError = self._asyncError, None
+            raise e
+
+    def stopAsyncWriter(self):
+        '''
+        Commits anything still queued by executeAsync() and stops the writer thread.
+        '''
+        with self._writerLock:
+            if self._writer is not None:
+                self._writeq.put(None)
+                self._writer.join()
+                self._writer = None
+
+    def closeThreadConnections(self):
+        '''
+        Closes all connections opened by threadConnection().
+        They must no longer be in use by their threads.
+        '''
+        with self._threadConnectionsLock:
+            for con in self._threadConnections:
+                con.close()
+            self._threadConnections.clear()
+        self._local = threading.local()
+
+    @contextmanager
+    def transaction(self, commit: bool=True, immediate: bool=False):
+        '''
+        Context manager for an explicit transaction.
+        The transaction is committed on exit, or rolled back if an exception is raised.
+
+        If a transaction is already open, it is joined through a savepoint instead:
+        an exception rolls back only what was done inside the block, and the
+        transaction is otherwise left open (never committed) on exit.
+
+        Example:
+            with d.transaction():
+                d['table1'].insertMany(rows1)
+                d['table2'].insertMany(rows2)
+
+        Parameters
+        ----------
+        commit : bool, optional
+            Commits on a successful exit if True. Otherwise the transaction is left
+            open for a later commit(), but is still rolled back on an exception.
+            The default is True.
+        immediate : bool, optional
+            Starts with BEGIN IMMEDIATE, taking the write lock up front. Use this for transactions
+            that will write, so that with other connections writing, waiting happens at the start
+            (within the busy timeout) rather than failing with SQLITE_BUSY when a read lock
+            can't be upgraded part-way through. The default is False.
+        '''
+        if self.con.in_transaction:
+            # Savepoints nest, and ROLLBACK TO/RELEASE act on the innermost one with this name
+            self.con.execute("SAVEPOINT sew_transaction")
+            try:
+                yield self
+            except BaseException:
+                self.con.execute("ROLLBACK TO sew_transaction")
+                self._cacheGeneration += 1
+                raise
+            finally:
+                self.con.execute("RELEASE sew_transaction")
+            return
+
+        # Separate cursor, so pending results on self.cur are untouched
+        self.con.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        else:
+            if commit:
+                self.con.commit()
+
+    def attach(self, path: str, alias: str):
+        '''
+        Attaches another database file to the current connection, so it can be queried as
+        alias.tablename (including joins across the databases) without opening another connection.
+
+        Tables in attached databases are not added to the internal table structure;
+        use execute() directly for them.
+
+        Parameters
+        ----------
+        path : str
+            Path to the database file to attach. It is created if it doesn't exist.
+        alias : str
+            The schema name to attach it as.
+        '''
+        self.cur.execute("attach database ? as ?", (path, alias))
+
+    def detach(self, alias: str):
+        '''
+        Detaches a database attached with attach().
+        This fails if a transaction is open, so commit first.
+
+        Parameters
+        ----------
+        alias : str
+            The schema name it was attached as.
+        '''
+        self.cur.execute("detach database ?", (alias,))
+
+    @property
+    def attached(self):
+        '''
+        List of the schema names of all attached databases.
+        '''
+        rows = self.con.execute("pragma database_list").fetchall()
+        # Skip 'main' and 'temp'
+        return [row[1] for row in rows if row[1] not in ("main", "temp")]
+
+    def optimize(self, analysisLimit: int=400):
+        '''
+        Runs PRAGMA optimize, which refreshes the query planner's statistics for tables
+        where they are likely out of date. SQLite recommends this before closing a
+        long-lived connection; it is run for you when a file database is used in a with statement.
 
-        if pragma_foreign_keys:
-            self.cur.execute("PRAGMA foreign_keys=ON")
+        Parameters
+        ----------
+        analysisLimit : int, optional
+            PRAGMA analysis_limit i.e. the approximate number of rows examined per index,
+            which keeps this fast on large tables. The default is 400.
+        '''
+        self.con.execute(f"PRAGMA analysis_limit={int(analysisLimit)}")
+        self.con.execute("PRAGMA optimize")
+
+    def analyze(self, tablename: str=None):
+        '''
+        Runs ANALYZE to gather full query planner statistics, e.g. after a large bulk insert
+        into an indexed table.
+
+        Parameters
+        ----------
+        tablename : str, optional
+            Only analyzes this table (and its indices). The default is None, which analyzes everything.
+        '''
+        self.con.execute("ANALYZE" if tablename is None else f'ANALYZE "{tablename}"')
+
+    @contextmanager
+    def raw(self):
+        '''
+        Context manager that temporarily disables the row factory, so rows are fetched
+        as plain tuples. This avoids allocating a sqlite3.Row for every row in large fetches.
+
+        Example:
+            with d.raw():
+                d['mytable'].select("*")
+                rows = d.fetchall() # List of tuples
+        '''
+        # Cursors copy the row factory when created, so self.cur must be switched as well
+        prevCon, prevCur = self.con.row_factory, self.cur.row_factory
+        self.con.row_factory = None
+        self.cur.row_factory = None
+        try:
+            yield self
+        finally:
+            self.con.row_factory = prevCon
+            self.cur.row_factory = prevCur
 
     def __enter__(self):
         '''
@@ -43,9 +492,30 @@ class SqliteContainer:
     def __exit__(self, type, value, traceback):
         '''
         For use in a with statement.
-        Closes the connection for you, unlike default sqlite3.Connection.
+        Closes the connection for you (see close()), unlike default sqlite3.Connection.
+        Databases created by this container are optimized (see optimize()) first if the block exits normally;
+        set optimizeOnExit to True or False to change this.
         '''
+        self.stopAsyncWriter()
+        if type is None and self.optimizeOnExit:
+            self.optimize()
+        self.close()
+
+    def close(self):
+        '''
+        Commits anything still queued by executeAsync() and stops its writer,
+        then closes the connections from threadConnection() and the main connection.
+        '''
+        self.stopAsyncWriter()
+        self.closeThreadConnections()
         self.con.close()
+
+    def rollback(self):
+        '''
+        Rolls back the current transaction, and invalidates any rows cached from it.
+        '''
+        self._cacheGeneration += 1
+        self.con.rollback()
         
 #%% Mixin to redirect common sqlite methods for brevity in code later
 class CommonRedirectMixin:
@@ -55,7 +525,6 @@ class CommonRedirectMixin:
         '''
         super().__init__(*args, **kwargs)
         
-        self.close = self.con.close
         self.execute = self.cur.execute
         self.executemany = self.cur.executemany
         self.commit = self.con.commit
@@ -68,13 +537,18 @@ class StatementGeneratorMixin:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
     
+    # Precomputed placeholder strings for up to 128 columns, indexed by the number of columns
+    _questionMarks = tuple(','.join('?' * n) for n in range(129))
+    _questionMarksWide = dict() # Memo for wider tables, filled on demand
+
     @staticmethod
     def _encloseTableName(tablename: str):
-        return '"%s"' % tablename
+        return f'"{tablename}"'
 
     @staticmethod
     def _makeTableColumns(fmt: dict):
-        return ', '.join([' '.join(i) for i in fmt['cols']])
+        # Join every part of each column spec, so entries like [name, type, 'PRIMARY KEY'] still work
+        return ', '.join(' '.join(col) for col in fmt['cols'])
     
     @staticmethod
     def _makeTableConditions(fmt: dict):
@@ -83,45 +557,62 @@ class StatementGeneratorMixin:
     @staticmethod
     def _makeTableForeignKeys(fmt: dict):
         return ', '.join(
-            ["FOREIGN KEY(%s) REFERENCES %s" % (i[0], i[1]) for i in fmt['foreign_keys']])
+            f"FOREIGN KEY({child}) REFERENCES {parent}" for child, parent in fmt['foreign_keys'])
     
     @staticmethod
     def _makeCreateTableStatement(
         fmt: dict, tablename: str, ifNotExists: bool=False, encloseTableName: bool=True
     ):
-        stmt = "create table%s %s(%s%s%s)" % (
-            " if not exists" if ifNotExists else '',
-            StatementGeneratorMixin._encloseTableName(tablename) if encloseTableName else tablename,
-            StatementGeneratorMixin._makeTableColumns(fmt),
-            ", %s" % (StatementGeneratorMixin._makeTableConditions(fmt)) if len(fmt['conds']) > 0 else '',
-            ", %s" % (StatementGeneratorMixin._makeTableForeignKeys(fmt)) if fmt.get('foreign_keys') is not None and len(fmt['foreign_keys']) > 0 else ''
-        )
-        return stmt
+        existsStr = " if not exists" if ifNotExists else ''
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        # Columns, conditions and foreign keys all go into one join, without building the pieces separately
+        body = ', '.join(chain(
+            (' '.join(col) for col in fmt['cols']),
+            fmt['conds'],
+            (f"FOREIGN KEY({child}) REFERENCES {parent}" for child, parent in fmt.get('foreign_keys') or ())
+        ))
+        return f"create table{existsStr} {tablename}({body})"
     
     @staticmethod
     def _makeCreateViewStatemnt(
         selectStmt: str, viewtablename: str, ifNotExists: bool=False, encloseTableName: bool=True
     ):
-        stmt = "create view%s %s as %s" % (
-            " if not exists" if ifNotExists else '',
-            StatementGeneratorMixin._encloseTableName(viewtablename) if encloseTableName else viewtablename,
-            selectStmt
-        )
-        return stmt
+        existsStr = " if not exists" if ifNotExists else ''
+        viewtablename = f'"{viewtablename}"' if encloseTableName else viewtablename
+        return f"create view{existsStr} {viewtablename} as {selectStmt}"
 
     @staticmethod
     def _makeQuestionMarks(n: int): # fmt: dict):
-        return ','.join(["?"] * n)
+        if n < 129:
+            return StatementGeneratorMixin._questionMarks[n]
+        qmarks = StatementGeneratorMixin._questionMarksWide.get(n)
+        if qmarks is None:
+            qmarks = StatementGeneratorMixin._questionMarksWide[n] = ','.join('?' * n)
+        return qmarks
     
     @staticmethod
     def _makeNotNullConditionals(cols: dict):
-        return ' and '.join(("%s is not null" % (i[0]) for i in cols))
+        return ' and '.join(f"{col[0]} is not null" for col in cols)
     
+    @staticmethod
+    def _stitchConditionsList(conditions: list):
+        # For call sites that always have a list (or other non-str iterable) of conditions
+        return f' where {" and ".join(conditions)}'
+
+    @staticmethod
+    def _stitchConditionsStr(condition: str):
+        # For call sites that always have a single condition
+        return f' where {condition}'
+
     @staticmethod
     def _stitchConditions(conditions: list):
-        conditionsList = [conditions] if isinstance(conditions, str) else conditions # Turn into a list if supplied as a single string
-        conditionsStr = ' where ' + ' and '.join(conditionsList) if isinstance(conditionsList, list) else ''
-        return conditionsStr
+        # A single condition may be supplied as a string
+        if conditions is None:
+            return ''
+        elif isinstance(conditions, str):
+            return StatementGeneratorMixin._stitchConditionsStr(conditions)
+        else:
+            return StatementGeneratorMixin._stitchConditionsList(conditions)
     
     @staticmethod
     def _makeCaseSingleConditionVariable(conditionVariable: str, whenthens: list, finalElse: str):
@@ -155,9 +646,9 @@ class StatementGeneratorMixin:
             conditions evaluate to true.
         """
         # Stitch together the when/then sub statements
-        whenthensStr = "\n".join(["WHEN %s THEN %s" % (i[0], i[1]) for i in whenthens])
+        whenthensStr = "\n".join(f"WHEN {when} THEN {then}" for when, then in whenthens)
         # Then combine with the final else statement and condition
-        s = "CASE %s\n%s\nELSE %s\nEND" % (conditionVariable, whenthensStr, finalElse)
+        s = f"CASE {conditionVariable}\n{whenthensStr}\nELSE {finalElse}\nEND"
 
         return s
         
@@ -193,9 +684,9 @@ class StatementGeneratorMixin:
             conditions evaluate to true.
         """
         # Stitch together the when/then sub statements
-        whenthensStr = "\n".join(["WHEN %s THEN %s" % (i[0], i[1]) for i in whenthens])
+        whenthensStr = "\n".join(f"WHEN {when} THEN {then}" for when, then in whenthens)
         # Then combine with the final else statement and condition
-        s = "CASE\n%s\nELSE %s\nEND" % (whenthensStr, finalElse)
+        s = f"CASE\n{whenthensStr}\nELSE {finalElse}\nEND"
 
         return s
     
@@ -205,61 +696,98 @@ class StatementGeneratorMixin:
                              conditions: list=None,
                              orderBy: list=None,
                              encloseTableName: bool=True):
-        # Parse columns into comma separated string
-        columns = ','.join(columnNames) if isinstance(columnNames, list) else columnNames
-        # Parse conditions with additional where keyword
-        conditions = StatementGeneratorMixin._stitchConditions(conditions)
+        # Parse columns into comma separated string; any non-str iterable (list, tuple, generator) is joined.
+        # isinstance rather than a match statement, to support python 3.9
+        columns = columnNames if isinstance(columnNames, str) else ','.join(columnNames)
+        # Parse conditions with additional where keyword (inlined _stitchConditions)
+        if conditions is None:
+            conditions = ''
+        elif isinstance(conditions, str):
+            conditions = f' where {conditions}'
+        else:
+            conditions = f' where {" and ".join(conditions)}'
         # Parse order by as comma separated string and pad the order by keywords
-        orderBy = [orderBy] if isinstance(orderBy, str) else orderBy
-        orderBy = ' order by %s' % (','.join(orderBy)) if isinstance(orderBy, list) else ''
+        if orderBy is None:
+            orderBy = ''
+        elif isinstance(orderBy, str):
+            orderBy = f' order by {orderBy}'
+        else:
+            orderBy = f' order by {",".join(orderBy)}'
         # Create the statement
-        stmt = "select %s from %s%s%s" % (
-                columns,
-                StatementGeneratorMixin._encloseTableName(tablename) if encloseTableName else tablename,
-                conditions,
-                orderBy
-            )
-        return stmt
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        return f"select {columns} from {tablename}{conditions}{orderBy}"
     
     @staticmethod
     def _makeInsertStatement(
         tablename: str, fmt: dict, orReplace: bool=False, encloseTableName: bool=True
     ):
-        stmt = "insert%s into %s values(%s)" % (
-                " or replace" if orReplace else '',
-                StatementGeneratorMixin._encloseTableName(tablename) if encloseTableName else tablename,
-                StatementGeneratorMixin._makeQuestionMarks(len(fmt['cols']))
-            )
-        return stmt
+        replaceStr = " or replace" if orReplace else ''
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        return f"insert{replaceStr} into {tablename} values({StatementGeneratorMixin._makeQuestionMarks(len(fmt['cols']))})"
+
+    @staticmethod
+    def _makeMultiRowInsertStatement(
+        tablename: str, fmt: dict, nrows: int, orReplace: bool=False, encloseTableName: bool=True
+    ):
+        rowStr = f"({StatementGeneratorMixin._makeQuestionMarks(len(fmt['cols']))})"
+        replaceStr = " or replace" if orReplace else ''
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        return f"insert{replaceStr} into {tablename} values{','.join([rowStr] * nrows)}"
     
     @staticmethod
     def _makeInsertStatementWithNamedColumns(
         tablename: str, insertedColumns: list, orReplace: bool=False, encloseTableName: bool=True
     ):
-        stmt = "insert%s into %s(%s) values(%s)" % (
-            " or replace" if orReplace else '',
-            StatementGeneratorMixin._encloseTableName(tablename) if encloseTableName else tablename,
-            ','.join(insertedColumns),
-            StatementGeneratorMixin._makeQuestionMarks(len(insertedColumns))
-        )
-        return stmt
+        replaceStr = " or replace" if orReplace else ''
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        return f"insert{replaceStr} into {tablename}({','.join(insertedColumns)}) values({StatementGeneratorMixin._makeQuestionMarks(len(insertedColumns))})"
     
+    @staticmethod
+    def _makeInsertRangeStatement(
+        tablename: str, columnExprs: list, orReplace: bool=False, encloseTableName: bool=True
+    ):
+        # generate_series() is an optional extension, so count with a recursive CTE instead.
+        # The single parameter ?1 is the number of rows; the first row is skipped if it is 0
+        replaceStr = " or replace" if orReplace else ''
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        return (
+            "with recursive series(value) as (select 0 where 0 < ?1 union all select value+1 from series where value+1 < ?1) "
+            f"insert{replaceStr} into {tablename} select {','.join(columnExprs)} from series"
+        )
+
     @staticmethod
     def _makeDropStatement(tablename: str):
-        stmt = "drop table %s" % tablename
-        return stmt
+        return f"drop table {tablename}"
     
     @staticmethod
     def _makeDeleteStatement(
         tablename: str, conditions: list=None, encloseTableName: bool=True):
-        stmt = "delete from %s%s" % (
-            StatementGeneratorMixin._encloseTableName(tablename) if encloseTableName else tablename,
-            StatementGeneratorMixin._stitchConditions(conditions)
-        )
-        return stmt
+        tablename = f'"{tablename}"' if encloseTableName else tablename
+        return f"delete from {tablename}{StatementGeneratorMixin._stitchConditions(conditions)}"
     
+# Repeated selects (e.g. the same query per request) reuse the built statement;
+# arguments must be hashable i.e. strings or tuples rather than lists
+_cachedSelectStatement = lru_cache(maxsize=512)(StatementGeneratorMixin._makeSelectStatement)
+_cachedDeleteStatement = lru_cache(maxsize=256)(StatementGeneratorMixin._makeDeleteStatement)
+
 #%% We will not assume the CommonRedirectMixins here
 class CommonMethodMixin(StatementGeneratorMixin):
+    # The schema query is fixed, so build it once
+    _reloadTablesStmt = StatementGeneratorMixin._makeSelectStatement(
+        ["name","sql","type"], "sqlite_master", conditions=["type='table' or type='view'"])
+    # Every foreign key in the schema in one query, as parent table, parent column, child table, child column.
+    # Keys that implicitly reference the parent's primary key have no parent column, and are skipped
+    _reloadRelationsStmt = (
+        'select fk."table", fk."to", m.name, fk."from" '
+        "from sqlite_master m, pragma_foreign_key_list(m.name) fk "
+        'where m.type=\'table\' and fk."to" is not null order by m.rowid, fk.id desc, fk.seq'
+    )
+    # The same, for a single (child) table
+    _tableRelationsStmt = (
+        'select "table", "to", "from" from pragma_foreign_key_list(?) '
+        'where "to" is not null order by id desc, seq'
+    )
+
     def __init__(self, *args, **kwargs):
         '''
         Includes common methods to create and drop tables, and provides
@@ -270,13 +798,62 @@ class CommonMethodMixin(StatementGeneratorMixin):
         
         self._tables = dict()
         self._relations = dict() # Establish in-memory parent->child mappings
+        self._schemaCache = dict() # Create table sql -> parsed format, so reloads skip re-parsing
         self.reloadTables()
 
+    @contextmanager
+    def bulkInsertContext(self):
+        '''
+        Context manager that keeps the rollback journal in memory for a bulk insert, and
+        restores the previous journal mode afterwards. Everything done inside
+        the context is committed on exit, or rolled back if an exception is raised.
+
+        Note that with the journal in memory, a crash during the insert may corrupt
+        the database, so this is best used when (re)building a database from scratch.
+        (journal_mode=OFF would save a little more, but makes rollback undefined.)
+
+        The journal mode cannot be changed inside a transaction, so this raises
+        ValueError if one is open; commit or roll back first.
+
+        Example:
+            with d.bulkInsertContext():
+                d['table1'].insertMany(rows)
+        '''
+        if self.con.in_transaction:
+            raise ValueError("bulkInsertContext() cannot be used inside an open transaction; commit or roll back first.")
+        self.cur.execute("PRAGMA journal_mode")
+        prevMode = self.cur.fetchone()[0]
+        self.cur.execute("PRAGMA journal_mode=MEMORY")
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        else:
+            self.con.commit()
+        finally:
+            self.cur.execute("PRAGMA journal_mode=%s" % prevMode)
+
+    def _parseSchema(self, table_sql: str):
+        '''
+        Parses a create table statement into a format dictionary, memoized on the statement text.
+        The returned dictionary is shared by every table with the same statement, so treat it as read-only.
+        '''
+        fmt = self._schemaCache.get(table_sql)
+        if fmt is None:
+            fmt = self._schemaCache[table_sql] = FormatSpecifier.fromSql(table_sql).generate()
+        return fmt
+
+    def _makeTableProxy(self, table_name: str, fmt: dict):
+        '''Creates the proxy object for a normal table. Plugins override this to use their own proxy.'''
+        return TableProxy(self, table_name, fmt)
+
     def _parseTable(
         self,
         table_name: str,
         table_sql: str,
-        table_type: str
+        table_type: str,
+        fmt: dict=None
     ) -> dict:
         """
         Parses the parameters of a table and appropriately
@@ -294,6 +871,9 @@ class CommonMethodMixin(StatementGeneratorMixin):
             SQLite statement used in generation of the table.
         table_type : str
             Table type, either 'table' or 'view'.
+        fmt : dict, optional
+            The format dictionary the table was created with, if known.
+            This skips re-parsing table_sql. The default is None.
 
         Returns
         -------
@@ -303,6 +883,16 @@ class CommonMethodMixin(StatementGeneratorMixin):
             the MetaTable object.
         """
         dataToMeta = dict()
+        if fmt is None and table_type != 'view':
+            fmt = self._parseSchema(table_sql)
+        elif fmt is not None:
+            # Copy, so later changes to the caller's dictionary don't leak in
+            fmt = {
+                'cols': [list(col) for col in fmt['cols']],
+                'conds': list(fmt.get('conds', [])),
+                'foreign_keys': [list(fk) for fk in fmt.get('foreign_keys', [])]
+            }
+
         # Special case for view
         if table_type == 'view':
             self._tables[table_name] = ViewProxy(self, table_name)
@@ -310,16 +900,13 @@ class CommonMethodMixin(StatementGeneratorMixin):
         # Special cases for metadata tables
         elif table_name.endswith(MetaTableProxy.requiredTableSuffix):
             self._tables[table_name] = MetaTableProxy(
-                self, table_name, 
-                FormatSpecifier.fromSql(table_sql).generate())
+                self, table_name, fmt)
             # We also retrieve all associated data table names
             assocDataTables = self._tables[table_name].getDataTables()
             for dt in assocDataTables:
                 dataToMeta[dt] = table_name
         else:
-            self._tables[table_name] = TableProxy(
-                self, table_name, 
-                FormatSpecifier.fromSql(table_sql).generate())
+            self._tables[table_name] = self._makeTableProxy(table_name, fmt)
 
         return dataToMeta
 
@@ -351,34 +938,6 @@ class CommonMethodMixin(StatementGeneratorMixin):
         )
 
 
-    def _parseRelationship(
-        self,
-        tablename: str
-    ):
-        """
-        Parses a table's parent-child relationships
-        i.e. any foreign key relationships.
-
-        Assumes the table is already present in the internal
-        structure via ._parseTable().
-
-        Parameters
-        ----------
-        tablename : str
-            Target tablename.
-        """
-        if not isinstance(self._tables[tablename], ViewProxy):
-            parents = FormatSpecifier.getParents(
-                self._tables[tablename]._fmt)
-            # Append to the relationship dict
-            for parent, child_cols in parents.items():
-                if parent not in self._relations.keys():
-                    self._relations[parent] = list()
-                for child_col in child_cols:
-                    self._relations[parent].append((tablename,
-                                                    child_col))
-
-
     def reloadTables(self):
         '''
         Loads and parses the details of all tables from sqlite_master.
@@ -388,31 +947,32 @@ class CommonMethodMixin(StatementGeneratorMixin):
         results : 
             Sqlite results from fetchall(). This is usually used for debugging.
         '''
-        stmt = self._makeSelectStatement(["name","sql","type"], "sqlite_master",
-                                         conditions=["type='table' or type='view'"])
-        self.cur.execute(stmt)
+        self.cur.execute(self._reloadTablesStmt)
         results = self.cur.fetchall()
         self._tables.clear()
+        for name, _, _ in results: # Unpack by position so any row_factory works
+            self._tables[name] = None # Placeholder, so the tables keep sqlite_master's order
 
+        # Metadata tables first, so that their data tables can be built as DataTableProxy directly
+        # (a metadata table may come after its data tables in sqlite_master)
         dataToMeta = dict()
-        for result in results:
-            newDtm = self._parseTable(
-                result['name'], result['sql'], result['type']
-            )
-            # Merge into dataToMeta
-            dataToMeta.update(newDtm)
-
-        # Iterate over all the tables to upgrade them to data tables if they exist
-        for table in self._tables:
-            if table in dataToMeta.keys():
-                self._parseDataTable(
-                    table,
-                    dataToMeta[table]
-                )
+        metaSuffix = MetaTableProxy.requiredTableSuffix
+        for name, sql, tabletype in results:
+            if tabletype == 'table' and name.endswith(metaSuffix):
+                dataToMeta.update(self._parseTable(name, sql, tabletype))
+
+        for name, sql, tabletype in results:
+            if tabletype == 'table' and name.endswith(metaSuffix):
+                continue
+            if tabletype == 'table' and name in dataToMeta:
+                self._tables[name] = DataTableProxy(self, name, self._parseSchema(sql), dataToMeta[name])
+            else:
+                self._parseTable(name, sql, tabletype)
 
-            # While doing so, check if it has foreign keys
-            # But only if its not a view
-            self._parseRelationship(table)
+        # Rebuild the foreign key relationships straight from sqlite rather than per table
+        self._relations.clear()
+        for parent, parentCol, child, childCol in self.con.execute(self._reloadRelationsStmt):
+            self._relations.setdefault((parent, parentCol), []).append((child, childCol))
            
         return results
         
@@ -449,7 +1009,12 @@ class CommonMethodMixin(StatementGeneratorMixin):
             self.con.commit()
 
         # Update the internal structure
-        self._parseTable(tablename, stmt, 'table')
+        isNew = tablename not in self._tables # With ifNotExists, it may already be there
+        self._parseTable(tablename, stmt, 'table', fmt)
+        if isNew:
+            # Read the foreign keys back from sqlite, exactly as reloadTables() does
+            for parent, parentCol, childCol in self.con.execute(self._tableRelationsStmt, (tablename,)):
+                self._relations.setdefault((parent, parentCol), []).append((tablename, childCol))
         return stmt
 
     def createMetaTable(self, 
@@ -495,7 +1060,7 @@ class CommonMethodMixin(StatementGeneratorMixin):
             self.con.commit()
 
         # Populate internal structure
-        self._parseTable(tablename, stmt, 'table')
+        self._parseTable(tablename, stmt, 'table', fmt)
 
     def createDataTable(self, 
                         fmt: dict, 
@@ -539,23 +1104,24 @@ class CommonMethodMixin(StatementGeneratorMixin):
         if not metatablename in self._tables.keys():
             raise ValueError("Metadata table %s does not exist!" % metatablename)
 
-        # Insert the associated metadata into the metadata table
-        metastmt = self._makeInsertStatement(
-            metatablename,
-            self._tables[metatablename]._fmt,
-            orReplace=metaOrReplace,
-            encloseTableName=encloseTableName)
-        metadata.insert(0, tablename) # The first argument is the name of the data table
-        self.cur.execute(metastmt, metadata)
-
-        # Otherwise, everything else is the same
+        metastmt = self._tables[metatablename]._getInsertStatement(metaOrReplace, encloseTableName)
         stmt = self._makeCreateTableStatement(fmt, tablename, ifNotExists, encloseTableName)
-        self.cur.execute(stmt)
-        if commitNow:
+        # The metadata row and the table are created together, so a failed create
+        # (e.g. the table already exists) doesn't leave a dangling metadata row,
+        # even when joining a transaction that is already open
+        with self.transaction(commit=commitNow, immediate=True):
+            # Insert the associated metadata into the metadata table;
+            # the first argument is the name of the data table (without mutating the caller's list)
+            self.cur.execute(metastmt, (tablename, *metadata))
+
+            # Otherwise, everything else is the same
+            self.cur.execute(stmt)
+
+        if commitNow: # Also commits a transaction that was already open before this call
             self.con.commit()
 
         # Create the table internally
-        self._parseTable(tablename, stmt, 'table')
+        self._parseTable(tablename, stmt, 'table', fmt)
         # Update it as a special DataTable
         self._parseDataTable(tablename, metatablename)
 
@@ -580,6 +1146,17 @@ class CommonMethodMixin(StatementGeneratorMixin):
 
         # Remove from internal structure
         self._tables.pop(tablename) # TODO: handle meta/data table complications?
+        self._schemaCache.clear() # Don't keep parsed schemas of dropped tables around
+        # Drop its relationships, both as a parent and as a child
+        for parent, children in list(self._relations.items()):
+            if parent[0] == tablename:
+                del self._relations[parent]
+                continue
+            remaining = [child for child in children if child[0] != tablename]
+            if remaining:
+                self._relations[parent] = remaining
+            else:
+                del self._relations[parent]
     
     ### These are useful methods to direct calls to a table or query tables
     def __getitem__(self, tablename: str):
@@ -618,53 +1195,129 @@ class CommonMethodMixin(StatementGeneratorMixin):
     
 #%% Akin to configparser, we create a class for tables
 class TableProxy(StatementGeneratorMixin):
+    # Older sqlite versions cap the number of bound parameters per statement at 999
+    maxBoundVariables = 999
+    # Python type hints for columns, matched in order against the start of the lowercased sql type
+    columnTypePrefixes = (
+        (("int",), int), # All the versions have the substring 'int', so this works
+        (("text", "char"), str),
+        (("real", "double", "float"), float),
+        (("blob",), bytes),
+        (("numeric",), (int, float))
+    )
+    # Fallback for other declared types e.g. VARCHAR(255), following sqlite's own affinity rules
+    # (matched anywhere in the type, in this order); unlike sqlite, unknown types are not assumed numeric
+    columnTypeSubstrings = (
+        (("int",), int),
+        (("char", "clob", "text"), str),
+        (("blob",), bytes),
+        (("real", "floa", "doub"), float)
+    )
+    _typehintCache = dict() # sql type string -> python type hint, shared across tables
+
     def __init__(self, parent: SqliteContainer, tbl: str, fmt: dict):
         self._parent = parent # We redirect calls to the parent
         self._tbl = tbl # The tablename
         self._fmt = fmt
-        self._cols = self._populateColumns()
+        # Cache the full-row insert statements, since the format is fixed after construction
+        if fmt is not None:
+            self._insertStmt = self._makeInsertStatement(tbl, fmt, False)
+            self._insertOrReplaceStmt = self._makeInsertStatement(tbl, fmt, True)
+        # The bracket access statement only depends on the name
+        self._sliceStmt = f'SELECT * FROM "{tbl}" LIMIT ? OFFSET ?'
+        self._multiInsertStmts = dict() # (nrows, orReplace) -> full batch multi-row insert statement
+        self._namedInsertStmts = dict() # (columns, orReplace, encloseTableName) -> named-column insert statement
         
-    def _populateColumns(self):
-        cols = dict()
-        # typehints = 
-        for col in self._fmt['cols']:
-            colname = col[0]
-            # Parse the type (note that we cannot determine the upper/lowercase)
-            if re.match(r"int", col[1], flags=re.IGNORECASE): # All the versions have the substring 'int', so this works
-                cols[colname] = ColumnProxy(colname, int)
-            elif re.match(r"text", col[1], flags=re.IGNORECASE) or re.match(r"char", col[1], flags=re.IGNORECASE):
-                cols[colname] = ColumnProxy(colname, str)
-            elif re.match(r"real", col[1], flags=re.IGNORECASE) or re.match(r"double", col[1], flags=re.IGNORECASE) or re.match(r"float", col[1], flags=re.IGNORECASE):
-                cols[colname] = ColumnProxy(colname, float)
-            elif re.match(r"blob", col[1], flags=re.IGNORECASE):
-                cols[colname] = ColumnProxy(colname, bytes)
-            elif re.match(r"numeric", col[1], flags=re.IGNORECASE):
-                cols[colname] = ColumnProxy(colname, (int, float))
+    def _getInsertStatement(self, orReplace: bool, encloseTableName: bool):
+        '''
+        Returns the full-row insert statement, using the cached version where possible.
+        '''
+        if encloseTableName:
+            return self._insertOrReplaceStmt if orReplace else self._insertStmt
+        return self._makeInsertStatement(self._tbl, self._fmt, orReplace, encloseTableName)
+
+    def _getMultiRowInsertStatement(self, nrows: int, orReplace: bool, encloseTableName: bool):
+        '''
+        Returns the multi-row insert statement for nrows rows. Only full batches
+        (as many rows as maxBoundVariables allows) are cached, since remainders vary in size.
+        '''
+        if encloseTableName and nrows == self.maxBoundVariables // len(self._fmt['cols']):
+            key = (nrows, orReplace)
+            stmt = self._multiInsertStmts.get(key)
+            if stmt is None:
+                stmt = self._multiInsertStmts[key] = self._makeMultiRowInsertStatement(
+                    self._tbl, self._fmt, nrows, orReplace, encloseTableName)
+            return stmt
+        return self._makeMultiRowInsertStatement(self._tbl, self._fmt, nrows, orReplace, encloseTableName)
+
+    def _getNamedInsertStatement(self, columns, orReplace: bool, encloseTableName: bool=True):
+        '''
+        Returns the insert statement for the given columns, building it only on first use.
+        '''
+        key = (tuple(columns), orReplace, encloseTableName)
+        stmt = self._namedInsertStmts.get(key)
+        if stmt is None:
+            stmt = self._namedInsertStmts[key] = self._makeInsertStatementWithNamedColumns(
+                self._tbl, key[0], orReplace, encloseTableName)
+        return stmt
+
+    @cached_property
+    def _foreignKeyParents(self):
+        # Child column -> (parent table, parent column), parsed from "parent(col)" once, in schema order
+        parents = dict()
+        for child_col, parent in self._fmt['foreign_keys']:
+            parent_table, parent_col = parent.split("(")
+            parents[child_col] = (parent_table, parent_col[:-1])
+        return parents
+
+    @cached_property
+    def _cols(self):
+        # Built on first use, so reloading a database with many tables doesn't parse every column
+        return self._populateColumns()
+
+    @classmethod
+    def _typehintFor(cls, sqltype: str):
+        '''
+        Returns the python type hint for a sql type string, scanning the prefixes only once per distinct string.
+        '''
+        typehint = cls._typehintCache.get(sqltype)
+        if typehint is None:
+            # Parse the type by its prefix (note that we cannot determine the upper/lowercase)
+            lowered = sqltype.lower()
+            for prefixes, typehint in cls.columnTypePrefixes:
+                if lowered.startswith(prefixes):
+                    break
             else:
-                # cols[colname] = ColumnProxy(colname, object)
-                raise NotImplementedError("Unknown parse for sql type %s" % col[1])
-            
-        return cols
+                for substrings, typehint in cls.columnTypeSubstrings:
+                    if any(sub in lowered for sub in substrings):
+                        break
+                else:
+                    raise NotImplementedError("Unknown parse for sql type %s" % sqltype)
+            cls._typehintCache[sqltype] = typehint
+        return typehint
+
+    def _populateColumns(self):
+        return {
+            colname: ColumnProxy(colname, self._typehintFor(sqltype))
+            for colname, sqltype in self._fmt['cols']
+        }
     
 
     def __getitem__(self, i: slice):
         # For now, we don't have a built-in generator for limits and offsets
-        # So we must build the statement ourselves
+        # So we must build the statement ourselves; the limit and offset are bound,
+        # so every access reuses the same prepared statement
+        stmt = self._sliceStmt
         if isinstance(i, int):
-            self._parent.cur.execute(
-                "SELECT * FROM %s LIMIT %d OFFSET %d" % (
-                    self._tbl, 1, i
-                )
-            )
+            self._parent.cur.execute(stmt, (1, i))
             results = self._parent.cur.fetchone()
         elif isinstance(i, slice):
             if i.step is not None and i.step != 1:
                 raise ValueError("Cannot use a slice with a step")
-            self._parent.cur.execute(
-                "SELECT * FROM %s LIMIT %d OFFSET %d" % (
-                    self._tbl, i.stop - i.start, i.start
-                )
-            )
+            start = 0 if i.start is None else i.start
+            # A negative limit means no limit in sqlite
+            count = -1 if i.stop is None else max(0, i.stop - start)
+            self._parent.cur.execute(stmt, (count, start))
             results = self._parent.cur.fetchall()
         return results
 
@@ -698,6 +1351,8 @@ class TableProxy(StatementGeneratorMixin):
                encloseTableName: bool=True):
         '''
         Performs a select on the current table.
+        When fetching large results where named access is not needed, wrap the select
+        and fetch in "with db.raw():" to get plain tuples instead of a sqlite3.Row per row.
 
         Parameters
         ----------
@@ -736,11 +1391,12 @@ class TableProxy(StatementGeneratorMixin):
             The actual sqlite statement that was executed.
         '''
         
-        stmt = self._makeSelectStatement(
-            columnNames,
+        # Lists aren't hashable, so convert them for the statement cache
+        stmt = _cachedSelectStatement(
+            columnNames if isinstance(columnNames, str) else tuple(columnNames),
             self._tbl,
-            conditions,
-            orderBy,
+            conditions if conditions is None or isinstance(conditions, str) else tuple(conditions),
+            orderBy if orderBy is None or isinstance(orderBy, str) else tuple(orderBy),
             encloseTableName
         )
         self._parent.cur.execute(stmt)
@@ -771,8 +1427,10 @@ class TableProxy(StatementGeneratorMixin):
             The default is True.
         """
         
-        stmt = self._makeDeleteStatement(
-            self._tbl, conditions, encloseTableName)
+        stmt = _cachedDeleteStatement(
+            self._tbl,
+            conditions if conditions is None or isinstance(conditions, str) else tuple(conditions),
+            encloseTableName)
         self._parent.cur.execute(stmt)
         if commitNow:
             self._parent.con.commit()
@@ -831,21 +1489,18 @@ class TableProxy(StatementGeneratorMixin):
         stmt : str
             The actual sqlite statement that was executed.
         '''
-        if isinstance(args[0], tuple) or isinstance(args[0], list):
+        first = args[0]
+        if isinstance(first, (tuple, list)):
             raise TypeError("Do not enclose the arguments in a list/tuple yourself!")
         
-        if isinstance(args[0], dict):
-            keys = list(args[0].keys())
-            stmt = self._makeInsertStatementWithNamedColumns(
-                self._tbl, keys, orReplace, encloseTableName
-            )
-            self._parent.cur.execute(stmt, [args[0][k] for k in keys])
+        if isinstance(first, dict):
+            keys = tuple(first.keys())
+            stmt = self._getNamedInsertStatement(keys, orReplace, encloseTableName)
+            self._parent.cur.execute(stmt, [first[k] for k in keys])
     
         else:
-            stmt = self._makeInsertStatement(
-                self._tbl, self._fmt, orReplace, encloseTableName
-            )
-            self._parent.cur.execute(stmt, (args))
+            stmt = self._getInsertStatement(orReplace, encloseTableName)
+            self._parent.cur.execute(stmt, args)
 
         if commitNow:
             self._parent.con.commit()
@@ -876,11 +1531,14 @@ class TableProxy(StatementGeneratorMixin):
                 Two REAL columns
                 insertMany([(10.0, 20.0),(30.0, 40.0)])
             Example with generator:
-                data1 = np.array([...])
-                data2 = np.array([...])
                 insertMany(
-                    ((data1[i], data2[i]) for i in range(data1.size))
+                    ((i, i+1.0) for i in range(1000))
                 )
+            For numpy arrays, use insertNumpy(data1, data2) instead of a generator like
+            ((data1[i], data2[i]) for i in range(data1.size)); it converts each array in
+            one go rather than creating numpy scalars for every element.
+            A 2-D array (one row per table row) or a structured array (one field per column,
+            in table order) may also be passed directly, and is converted in one go.
             
         orReplace : bool, optional
             Overwrites the same data if True, otherwise a new row is created for every clash.
@@ -898,15 +1556,42 @@ class TableProxy(StatementGeneratorMixin):
         Returns
         -------
         stmt : str
-            The actual sqlite statement that was executed.
+            The single-row form of the insert statement. Rows are actually
+            bound in batches, with many rows per statement.
         '''
-        stmt = self._makeInsertStatement(
-            self._tbl, self._fmt, orReplace, encloseTableName
-        )
-
-        self._parent.cur.executemany(stmt, rows)
-
-        if commitNow:
+        # 2-D or structured numpy arrays become python rows in one C call, without importing numpy here
+        if getattr(rows, 'ndim', None) == 2 or getattr(getattr(rows, 'dtype', None), 'names', None):
+            rows = rows.tolist()
+
+        stmt = self._getInsertStatement(orReplace, encloseTableName)
+        ncols = len(self._fmt['cols'])
+        rowsPerStmt = max(1, self.maxBoundVariables // ncols)
+        multiStmt = self._getMultiRowInsertStatement(rowsPerStmt, orReplace, encloseTableName)
+
+        # Do everything in one explicit transaction (a single commit for the whole batch),
+        # so that a failure part-way rolls back the whole batch (only the batch, via a savepoint,
+        # if a transaction is already open); it is only committed here with commitNow
+        with self._parent.transaction(commit=commitNow, immediate=True):
+            # Pull the rows in chunks and bind each full chunk with a single multi-row statement,
+            # which amortises sqlite's per-statement overhead across many rows
+            execute = self._parent.cur.execute
+            it = iter(rows)
+            while True:
+                chunk = list(islice(it, rowsPerStmt))
+                if len(chunk) < rowsPerStmt:
+                    break
+                # Every row must have all columns, otherwise the flattened values would shift;
+                # fall back to executemany so sqlite raises its usual error
+                if set(map(len, chunk)) != {ncols}:
+                    self._parent.cur.executemany(stmt, chunk)
+                else:
+                    execute(multiStmt, list(chain.from_iterable(chunk)))
+
+            # Any leftover rows
+            if len(chunk) > 0:
+                self._parent.cur.executemany(stmt, chunk)
+
+        if commitNow: # Also commits a transaction that was already open before this call
             self._parent.con.commit()
         return stmt
     
@@ -938,6 +1623,8 @@ class TableProxy(StatementGeneratorMixin):
             
         commitNow : bool, optional
             Calls commit on the database connection after the transaction if True.
+            Otherwise the rows are left in an open transaction for a later commit().
+            If any row fails, none of the rows are inserted.
             The default is False.
 
         encloseTableName : bool, optional
@@ -950,22 +1637,160 @@ class TableProxy(StatementGeneratorMixin):
         stmt : str
             The actual sqlite statement that was executed.
         '''
-        keys = list(dictlist[0].keys())
-        stmt = self._makeInsertStatementWithNamedColumns(
-            self._tbl, keys, orReplace, encloseTableName
-        )
-        # Create a generator for the list of dictionaries
-        g = (
-            [dictlist[i][k] for k in keys]
-            for i in range(len(dictlist))
-        )
-        self._parent.cur.executemany(stmt, g)
+        keys = tuple(dictlist[0].keys())
+        stmt = self._getNamedInsertStatement(keys, orReplace, encloseTableName)
+        # Create a generator for the list of dictionaries; itemgetter pulls all the values in one C call
+        getValues = itemgetter(*keys)
+        g = map(getValues, dictlist) if len(keys) > 1 else ((getValues(d),) for d in dictlist)
+        # As in insertMany, all rows go in one explicit transaction that is rolled back on failure
+        with self._parent.transaction(commit=commitNow, immediate=True):
+            self._parent.cur.executemany(stmt, g)
+
+        if commitNow: # Also commits a transaction that was already open before this call
+            self._parent.con.commit()
 
-        if commitNow:
+        return stmt
+
+    def insertNumpy(self,
+                    *arrays,
+                    orReplace: bool=False,
+                    commitNow: bool=False,
+                    encloseTableName: bool=True):
+        '''
+        Performs an insert statement for multiple rows of data, where each column
+        is supplied as a separate numpy array. All columns must be inserted.
+
+        This is much faster than iterating over the arrays with a generator
+        (or np.nditer), since each array is converted to python objects in bulk
+        via ndarray.tolist(), which runs in a single C loop per array, instead of
+        creating a numpy scalar for every element.
+
+        Parameters
+        ----------
+        *arrays : numpy arrays
+            Each argument should represent a column in the table, in order.
+            Example:
+                Two REAL columns
+                insertNumpy(np.array([10.0, 30.0]), np.array([20.0, 40.0]))
+
+            Columns sliced out of a 2-D array (e.g. data[:,0]) are strided views;
+            these work, but converting them is slower than converting one contiguous
+            array per column (see np.ascontiguousarray).
+
+        orReplace : bool, optional
+            Overwrites the same data if True, otherwise a new row is created for every clash.
+            The default is False.
+
+        commitNow : bool, optional
+            Calls commit on the database connection after the transaction if True.
+            The default is False.
+
+        encloseTableName : bool, optional
+            Encloses the table name in quotes to allow for certain table names which may fail;
+            for example, this is necessary if the table name starts with digits.
+            The default is True.
+
+        Returns
+        -------
+        stmt : str
+            The single-row form of the insert statement. Rows are actually
+            bound in batches, with many rows per statement.
+        '''
+        return self._insertColumnLists(
+            [a.tolist() for a in arrays], orReplace, commitNow, encloseTableName)
+
+    def _insertColumnLists(self,
+                           cols: list,
+                           orReplace: bool=False,
+                           commitNow: bool=False,
+                           encloseTableName: bool=True):
+        '''
+        Inserts columns which have already been converted to lists of python objects.
+        See insertNumpy().
+        '''
+        if len(cols) == 0:
+            raise ValueError("At least one column must be inserted.")
+        stmt = self._getInsertStatement(orReplace, encloseTableName)
+        ncols = len(cols)
+        nrows = len(cols[0])
+        if any(len(col) != nrows for col in cols):
+            raise ValueError("All arrays must have the same length.")
+
+        # Interleave the columns into one flat, row-ordered list; the extended slice assignment runs in C
+        flat = [None] * (nrows * ncols)
+        for i, col in enumerate(cols):
+            flat[i::ncols] = col
+
+        # Bind as many rows as possible per statement, to amortise sqlite's per-statement overhead
+        rowsPerStmt = max(1, min(nrows, self.maxBoundVariables // ncols))
+        step = rowsPerStmt * ncols
+        full = (nrows // rowsPerStmt) * step
+        # One transaction for all the statements, so a failing batch rolls back the whole call (see insertMany)
+        with self._parent.transaction(commit=commitNow, immediate=True):
+            if full > 0:
+                multiStmt = self._getMultiRowInsertStatement(rowsPerStmt, orReplace, encloseTableName)
+                execute = self._parent.cur.execute
+                for j in range(0, full, step):
+                    execute(multiStmt, flat[j:j+step])
+            if full < len(flat):
+                self._parent.cur.execute(
+                    self._getMultiRowInsertStatement(nrows - full // ncols, orReplace, encloseTableName),
+                    flat[full:]
+                )
+
+        if commitNow: # Also commits a transaction that was already open before this call
             self._parent.con.commit()
+        return stmt
+
+    def insertRange(self,
+                    columnExprs: list,
+                    n: int,
+                    orReplace: bool=False,
+                    commitNow: bool=False,
+                    encloseTableName: bool=True):
+        '''
+        Inserts n rows which are computed inside sqlite from a counter,
+        so no rows are created in python at all. All columns must be inserted.
+
+        Parameters
+        ----------
+        columnExprs : list
+            One sqlite expression per column, in order. The counter is available as 'value',
+            and runs from 0 to n-1.
+            Example:
+                Two INTEGER columns holding (i, i+1)
+                insertRange(["value", "value+1"], 1000000)
 
+        n : int
+            Number of rows to insert.
+
+        orReplace : bool, optional
+            Overwrites the same data if True, otherwise a new row is created for every clash.
+            The default is False.
+
+        commitNow : bool, optional
+            Calls commit on the database connection after the transaction if True.
+            The default is False.
+
+        encloseTableName : bool, optional
+            Encloses the table name in quotes to allow for certain table names which may fail;
+            for example, this is necessary if the table name starts with digits.
+            The default is True.
+
+        Returns
+        -------
+        stmt : str
+            The actual sqlite statement that was executed.
+        '''
+        if len(columnExprs) != len(self._fmt['cols']):
+            raise ValueError("Expected %d column expressions, got %d." % (len(self._fmt['cols']), len(columnExprs)))
+
+        stmt = self._makeInsertRangeStatement(self._tbl, columnExprs, orReplace, encloseTableName)
+        self._parent.cur.execute(stmt, (n,))
+        if commitNow:
+            self._parent.con.commit()
         return stmt
-    
+
     def createView(
         self,
         columnNames: list,
@@ -1054,33 +1879,25 @@ class TableProxy(StatementGeneratorMixin):
         Raises
         ------
         KeyError
-            If foreign key is specified and does not exist.
+            If foreign key is specified and does not exist, or the table has no foreign keys.
         """
         # If no foreign key specified, assume the first foreign key in the schema
         if foreignKey is None:
-            fk = self._fmt['foreign_keys'][0]
+            if len(self._foreignKeyParents) == 0:
+                raise KeyError(f"The table {self._tbl} has no foreign keys")
+            child_col, (parent_table, parent_col) = next(iter(self._foreignKeyParents.items()))
         else:
-            fk = None
-            for tfk in self._fmt['foreign_keys']:
-                if tfk[0] == foreignKey:
-                    fk = tfk
-                    break
-            if fk is None:
+            try:
+                parent_table, parent_col = self._foreignKeyParents[foreignKey]
+            except KeyError:
                 raise KeyError(
                     f"The foreign key {foreignKey} does not exist in the table {self._tbl}"
-                )
-            
-        # Extract the child column
-        child_col = fk[0]
-
-        # Extract the parent
-        parent = fk[1]
-        parentspl = parent.split("(")
-        parent_table = parentspl[0]
-        parent_col = parentspl[1][:-1]
+                ) from None
+            child_col = foreignKey
 
-        # Now perform a select on the parent table
-        stmt = self._parent[parent_table].select("*", ["%s=%s" % (parent_col, str(row[child_col]))])
+        # Now perform a select on the parent table, binding the value so the statement is reused
+        stmt = _cachedSelectStatement("*", parent_table, (f"{parent_col}=?",), None, True)
+        self._parent.cur.execute(stmt, (row[child_col],))
         return stmt
 
         
@@ -1128,11 +1945,21 @@ class MetaTableProxy(TableProxy):
         # Format must contain 'data_tblname', and all other columns are treated as the actual metadata
         if not FormatSpecifier.dictContainsColumn(self._fmt, self.requiredColumn):
             raise ValueError("Format must contain 'data_tblname' as the primary key, but %s did not!" % self._fmt)
+        # The lookups only vary by the bound data table name, so build them once
+        self._getMetadataStmt = self._makeSelectStatement("*", self._tbl, [f"{self.requiredColumn}=?"])
+        self._getDataTablesStmt = self._makeSelectStatement(self.requiredColumn, self._tbl)
+        self._metadataCache = dict() # data_tblname -> metadata row, see getMetadataFor()
+        self._metadataCacheState = None # Connection's (total_changes, cache generation) when the cache was last valid
 
     def getMetadataFor(self, data_tblname: str):
         '''
         Returns the metadata for a particular data_tblname.
 
+        Rows are cached per metadata table until anything is written through this connection
+        (sqlite3.Connection.total_changes), anything is rolled back via this container, or
+        an executeAsync() batch is committed. Call invalidateMetadataCache() after writing to the
+        metadata table from any other connection, or after rolling back with raw SQL or con.rollback().
+
         Parameters
         ----------
         data_tblname : str
@@ -1143,13 +1970,25 @@ class MetaTableProxy(TableProxy):
         metadata : sqlite3.Row
             The metadata for the data_tblname.
         '''
-        stmt = self._makeSelectStatement("*", self._tbl, ["data_tblname='%s'" % data_tblname])
-        self._parent.cur.execute(stmt)
-        metadata = self._parent.cur.fetchone()
+        state = (self._parent.con.total_changes, self._parent._cacheGeneration)
+        if state != self._metadataCacheState:
+            self._metadataCache.clear()
+            self._metadataCacheState = state
+        metadata = self._metadataCache.get(data_tblname)
         if metadata is None:
-            raise ValueError("No metadata found for %s!" % data_tblname)
+            self._parent.cur.execute(self._getMetadataStmt, (data_tblname,))
+            metadata = self._parent.cur.fetchone()
+            if metadata is None:
+                raise ValueError("No metadata found for %s!" % data_tblname)
+            self._metadataCache[data_tblname] = metadata
         return metadata
 
+    def invalidateMetadataCache(self):
+        '''
+        Clears the rows cached by getMetadataFor().
+        '''
+        self._metadataCache.clear()
+
     def getDataTables(self):
         '''
         Returns a list of all the data tables associated to this metadata table.
@@ -1159,9 +1998,10 @@ class MetaTableProxy(TableProxy):
         data_tblnames : list
             A list of all the data tables in the database.
         '''
-        stmt = self._makeSelectStatement("data_tblname", self._tbl)
-        self._parent.cur.execute(stmt)
-        data_tblnames = [row[0] for row in self._parent.cur.fetchall()]
+        # Own cursor without a row factory: no sqlite3.Row per name, and pending results on the main cursor are kept
+        cur = self._parent.con.cursor()
+        cur.row_factory = None
+        data_tblnames = list(map(itemgetter(0), cur.execute(self._getDataTablesStmt)))
         return data_tblnames
 
 #%% Data tables act exactly like any other table, but keep track of their metadatatable internally
@@ -1197,52 +2037,64 @@ class DataTableProxy(TableProxy):
 
 #%% And also a class for columns
 ### TODO: Intention for this is to build it into a way to automatically generate conditions in select statements..
+# Conditions built in loops often repeat, and formatting the value (especially floats) dominates;
+# typed so that e.g. 1 and 1.0 keep their own string forms
+@lru_cache(maxsize=256, typed=True)
+def _columnCondition(name: str, op: str, x):
+    return f"{name} {op} {x}"
+
+def _makeColumnComparison(op: str):
+    '''
+    Creates a ColumnProxy comparison operator for op, with the type check inlined
+    so each comparison is a single call.
+    '''
+    def comparison(self, x):
+        if not isinstance(x, self.typehint):
+            raise TypeError("Compared value must be of type %s" % str(self.typehint))
+        return _columnCondition(self.name, op, x)
+    return comparison
+
 class ColumnProxy:
+    __slots__ = ('name', 'typehint') # One per column of every used table, so skip the per-instance dict
+
     def __init__(self, name: str, typehint: type):
         self.name = name
         self.typehint = typehint
         
-    def _requireType(self, x):
-        if not isinstance(x, self.typehint):
-            raise TypeError("Compared value must be of type %s" % str(self.typehint))
-        
-    def __lt__(self, x):
-        self._requireType(x)
-        return "%s < %s" % (self.name, str(x))
-
-    def __le__(self, x):
-        self._requireType(x)
-        return "%s <= %s" % (self.name, str(x))
-    
-    def __gt__(self, x):
-        self._requireType(x)
-        return "%s > %s" % (self.name, str(x))
-
-    def __ge__(self, x):
-        self._requireType(x)
-        return "%s >= %s" % (self.name, str(x))
-    
-    def __eq__(self, x):
-        self._requireType(x)
-        return "%s = %s" % (self.name, str(x))
-    
-    def __ne__(self, x):
-        self._requireType(x)
-        return "%s != %s" % (self.name, str(x))
+    __lt__ = _makeColumnComparison("<")
+    __le__ = _makeColumnComparison("<=")
+    __gt__ = _makeColumnComparison(">")
+    __ge__ = _makeColumnComparison(">=")
+    __eq__ = _makeColumnComparison("=")
+    __ne__ = _makeColumnComparison("!=")
+    __hash__ = None # As before; __eq__ builds a condition string rather than comparing
 
 
 class ColumnProxyContainer:
+    __slots__ = ('_cols',)
+
     def __init__(self, cols: dict[ColumnProxy]):
         self._cols = cols
-        # Write a setattr for each column name
-        for colProxy in self._cols:
-            setattr(self, colProxy, self._cols[colProxy])
+
+    def __getattr__(self, name: str):
+        # Only called when normal lookup fails i.e. for the column names
+        if name == '_cols': # Not set yet; avoid recursing
+            raise AttributeError(name)
+        try:
+            return self._cols[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __dir__(self):
+        return list(self._cols.keys())
 
 
 
 #%% Inherited class of all the above
 class Database(CommonRedirectMixin, CommonMethodMixin, SqliteContainer):
-    def __init__(self, dbpath: str, row_factory: type=sq.Row, pragma_foreign_keys: bool=True):
+    def __init__(self, dbpath: str, row_factory: type=sq.Row, pragma_foreign_keys: bool=True,
+                 pragmas: dict=None, journal_mode: str=None, synchronous: str=None,
+                 cache_size_kib: int=None, page_size: int=None, default_pragmas: bool=True):
         '''
         Instantiates an sqlite database container with all extra functionality included.
         This enables:
@@ -1262,8 +2114,23 @@ class Database(CommonRedirectMixin, CommonMethodMixin, SqliteContainer):
             The row factory for the sqlite3 connection. The default is the in-built sqlite3.Row.
         pragma_foreign_keys : bool, optional
             Turns on PRAGMA FOREIGN_KEYS. The default is True.
+        pragmas : dict, optional
+            Additional pragmas to issue right after connecting.
+            See SqliteContainer.fastWritePragmas. The default is None.
+        journal_mode : str, optional
+            PRAGMA journal_mode. The default is None, which uses WAL for newly created file databases.
+            Use False to never switch the journal mode.
+        synchronous : str, optional
+            PRAGMA synchronous. The default is None, which uses NORMAL for file databases.
+        cache_size_kib : int, optional
+            Page cache size in KiB. The default is None, which uses about 20 MB for file databases.
+        page_size : int, optional
+            Page size for newly created database files. The default is None, which uses 16 KiB.
+        default_pragmas : bool, optional
+            Applies SqliteContainer.defaultFilePragmas to file databases. The default is True.
         '''
-        super().__init__(dbpath, row_factory, pragma_foreign_keys)
+        super().__init__(dbpath, row_factory, pragma_foreign_keys, pragmas,
+                         journal_mode, synchronous, cache_size_kib, page_size, default_pragmas)
 
     
 #%%
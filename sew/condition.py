@@ -65,11 +65,11 @@ class Condition:
     def LIKE(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s LIKE %s" % (self._cond, other)
+            self._cond = f"{self._cond} LIKE {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s LIKE %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} LIKE {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -79,11 +79,11 @@ class Condition:
     def IN(self, other: Condition) -> Condition:
         # May be a tuple or list of strings
         if isinstance(other, list) or isinstance(other, tuple):
-            self._cond = "%s IN (%s)" % (self._cond, ",".join(other))
+            self._cond = f"{self._cond} IN ({','.join(other)})"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s IN (%s)" % (self._cond, ",".join(other._cond))
+            self._cond = f"{self._cond} IN ({','.join(other._cond)})"
 
         else:
             raise TypeError("Condition must be a list/tuple or Condition.")
@@ -96,11 +96,11 @@ class Condition:
     def __and__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s AND %s" % (self._cond, other)
+            self._cond = f"{self._cond} AND {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s AND %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} AND {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -110,11 +110,11 @@ class Condition:
     def __or__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s OR %s" % (self._cond, other)
+            self._cond = f"{self._cond} OR {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s OR %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} OR {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -124,11 +124,11 @@ class Condition:
     def __eq__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s = %s" % (self._cond, other)
+            self._cond = f"{self._cond} = {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s = %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} = {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -138,11 +138,11 @@ class Condition:
     def __ne__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s != %s" % (self._cond, other)
+            self._cond = f"{self._cond} != {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s != %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} != {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -152,11 +152,11 @@ class Condition:
     def __gt__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s > %s" % (self._cond, other)
+            self._cond = f"{self._cond} > {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s > %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} > {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -166,11 +166,11 @@ class Condition:
     def __ge__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s >= %s" % (self._cond, other)
+            self._cond = f"{self._cond} >= {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s >= %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} >= {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -180,11 +180,11 @@ class Condition:
     def __lt__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s < %s" % (self._cond, other)
+            self._cond = f"{self._cond} < {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s < %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} < {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
@@ -194,11 +194,11 @@ class Condition:
     def __le__(self, other: Condition) -> Condition:
         # May be a string, in which case just attach it to the current condition
         if isinstance(other, str):
-            self._cond = "%s <= %s" % (self._cond, other)
+            self._cond = f"{self._cond} <= {other}"
         
         # Otherwise mutate the current instance
         elif isinstance(other, Condition):
-            self._cond = "%s <= %s" % (self._cond, other._cond)
+            self._cond = f"{self._cond} <= {other._cond}"
 
         else:
             raise TypeError("Condition must be a string or Condition.")
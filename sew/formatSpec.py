@@ -48,10 +48,23 @@ class FormatSpecifier:
     keywordTypes = [
         "INTEGER", "INT", "REAL", "TEXT", "BLOB",
         "DOUBLE", "FLOAT", "NUMERIC"] # Non-exhaustive list of keyword types
+
+    # Precompiled patterns for fromSql()
+    _parenRegex = re.compile(r"\(.+\)") # Greedy
+    _uniqueRegex = re.compile(r"UNIQUE\(.+?\)", flags=re.IGNORECASE) # Non-greedy
+    _foreignKeyRegex = re.compile(r"FOREIGN KEY(.+?) REFERENCES (.+?)\)", flags=re.IGNORECASE)
+    _childColRegex = re.compile(r"\(.+?\)")
+    _referencesRegex = re.compile(r"REFERENCES ", flags=re.IGNORECASE)
+    _columnRegex = re.compile(r"(\w+)\s(%s)" % "|".join(keywordTypes), flags=re.IGNORECASE)
     
     # Constructor
-    def __init__(self, cols: list=[], conds: list=[], foreign_keys: list=[]):
-        self.fmt = {'cols': cols, 'conds': conds, 'foreign_keys': foreign_keys}
+    def __init__(self, cols: list=None, conds: list=None, foreign_keys: list=None):
+        # Avoid mutable default arguments, which would be shared between instances
+        self.fmt = {
+            'cols': cols if cols is not None else [],
+            'conds': conds if conds is not None else [],
+            'foreign_keys': foreign_keys if foreign_keys is not None else []
+        }
         
     def __repr__(self):
         return str(self.fmt)
@@ -66,9 +79,10 @@ class FormatSpecifier:
         self.fmt['cols'].append([columnName, self.sqliteTypes[typehint]])
         
     def addUniques(self, uniqueColumns: list):
-        if not all((i in self._getColumnNames() for i in uniqueColumns)):
+        columnNames = set(self._getColumnNames()) # Build once, not once per unique column
+        if not all((i in columnNames for i in uniqueColumns)):
             raise ValueError("Invalid column found.")
-        self.fmt['conds'].append("UNIQUE(%s)" % (','.join(uniqueColumns)))
+        self.fmt['conds'].append(f"UNIQUE({','.join(uniqueColumns)})")
 
     def addForeignKey(self, childParentPair: list):
         """
@@ -99,31 +113,29 @@ class FormatSpecifier:
             The create table statement.
         '''
         # Pull out everything after tablename, remove parentheses
-        fmtstr = re.search(r"\(.+\)", stmt.replace("\n","").replace("\r","")).group()[1:-1] # Greedy regex 
+        fmtstr = cls._parenRegex.search(stmt.replace("\n","").replace("\r","")).group()[1:-1] # Greedy regex 
         # Remove any uniques
-        uniques = re.finditer(r"UNIQUE\(.+?\)", fmtstr, flags=re.IGNORECASE) # Non-greedy regex
+        uniques = cls._uniqueRegex.finditer(fmtstr) # Non-greedy regex
         conds = []
         for unique in uniques:
             fmtstr = fmtstr.replace(unique.group(), "") # Drop the substring
             conds.append(unique.group())
         
         # Remove any foreign keys
-        foreignkeys = re.finditer(r"FOREIGN KEY(.+?) REFERENCES (.+?)\)", fmtstr, flags=re.IGNORECASE)
+        foreignkeys = cls._foreignKeyRegex.finditer(fmtstr)
         foreign_keys = []
         for foreign in foreignkeys:
             fmtstr = fmtstr.replace(foreign.group(), "") # Drop the substring
             # Get the child column name by searching the first brackets
-            childCol = re.search(r"\(.+?\)", foreign.group(), flags=re.IGNORECASE).group()[1:-1]
+            childCol = cls._childColRegex.search(foreign.group()).group()[1:-1]
             # Get the parent table/column name by taking everything after REFERENCES
-            parentColStart = re.search(r"REFERENCES ", foreign.group(), flags=re.IGNORECASE).span()[1]
+            parentColStart = cls._referencesRegex.search(foreign.group()).span()[1]
             parentCol = foreign.group()[parentColStart:]
             foreign_keys.append([childCol, parentCol])
 
         # There are some problems with the old way of getting the columns
         # To be safe, we use another regex that extracts based on the expected types
-        cols = re.finditer(
-            r"(\w+)\s(%s)" % "|".join(cls.keywordTypes), fmtstr, flags=re.IGNORECASE
-        )
+        cols = cls._columnRegex.finditer(fmtstr)
         cols = [i.group().split() for i in cols]
 
         # Note, due to pythonic default arguments only evaluating at definition time,
@@ -134,12 +146,7 @@ class FormatSpecifier:
     @staticmethod
     def dictContainsColumn(fmt: dict, colname: str):
         '''Checks if a generated format dictionary contains a particular column.'''
-        check = False
-        for i, col in enumerate(fmt['cols']):
-            if col[0] == colname:
-                check = True
-                break
-        return check
+        return any(col[0] == colname for col in fmt['cols'])
     
     @staticmethod
     def getParents(fmt: dict):
@@ -150,9 +157,7 @@ class FormatSpecifier:
             columnname = spl[1][:-1]
             # For the weird cases where the same parent column
             # is pointed to by two child columns in the same table
-            if (tablename, columnname) not in parents:
-                parents[(tablename, columnname)] = []
-            parents[(tablename, columnname)].append(keydesc[0]) # Map parent -> child column
+            parents.setdefault((tablename, columnname), []).append(keydesc[0]) # Map parent -> child column
         return parents
         
 
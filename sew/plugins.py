@@ -10,9 +10,13 @@ from ._core import *
 from .formatSpec import FormatSpecifier
 import pandas as pd
 import numpy as np
+from collections.abc import Iterator
 
 #%% Pandas plugins
 class PandasCommonMethodMixin(CommonMethodMixin):
+    def _makeTableProxy(self, table_name: str, fmt: dict):
+        return PandasTableProxy(self, table_name, fmt)
+
     def reloadTables(self):
         '''
         Loads and parses the details of all tables from sqlite_master.
@@ -29,8 +33,7 @@ class PandasCommonMethodMixin(CommonMethodMixin):
         results = self.cur.fetchall()
         self._tables.clear()
         for result in results:
-            self._tables[result[0]] = PandasTableProxy(self, result[0],
-                                                       FormatSpecifier.fromSql(result[1]).generate())
+            self._tables[result[0]] = PandasTableProxy(self, result[0], self._parseSchema(result[1]))
             
         return results
 
@@ -93,7 +96,52 @@ class PandasTableProxy(TableProxy):
         self._pdresults = pd.read_sql(stmt, self._parent.con) # Store into internals
         return stmt
     
-    # TODO: complete insert variations for pandas, using the df.to_sql() command
+    def insertDataFrame(self,
+                        df: pd.DataFrame,
+                        chunksize: int=None,
+                        orReplace: bool=False):
+        '''
+        Inserts the rows of a dataframe into the current table.
+        Dataframe columns are matched to table columns by name; the index is not inserted.
+        The insert is always committed, or rolled back as a whole if it fails.
+
+        df.to_sql() commits or rolls back whatever is pending on the connection, so this raises
+        ValueError if a transaction is already open, rather than committing (or discarding) the
+        caller's uncommitted writes; commit or roll back first.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The dataframe to insert.
+        chunksize : int, optional
+            Number of rows bound per multi-row insert statement.
+            The default is None, which fits as many rows as the bound variable limit allows.
+        orReplace : bool, optional
+            Uses an 'insert or replace' statement instead.
+            This is not supported by df.to_sql(), so rows are inserted with executemany().
+            The default is False.
+
+        Returns
+        -------
+        stmt : str or None
+            The 'insert or replace' statement if orReplace is True, otherwise None
+            since the statements are generated by pandas.
+        '''
+        if self._parent.con.in_transaction:
+            raise ValueError("insertDataFrame() cannot be used inside an open transaction; commit or roll back first.")
+
+        if orReplace:
+            stmt = self._getNamedInsertStatement(df.columns, orReplace=True)
+            with self._parent.transaction(immediate=True):
+                self._parent.cur.executemany(stmt, df.itertuples(index=False, name=None))
+            return stmt
+
+        if chunksize is None:
+            chunksize = max(1, self.maxBoundVariables // max(1, len(df.columns)))
+        # 'multi' packs each chunk into one insert statement; pandas commits when done
+        df.to_sql(self._tbl, self._parent.con, if_exists='append', index=False,
+                  method='multi', chunksize=chunksize)
+        return None
         
 class PandasDatabase(CommonRedirectMixin, PandasCommonMethodMixin, SqliteContainer):
     pass
@@ -116,6 +164,9 @@ class NumpyCommonMethodMixin(CommonMethodMixin):
         4) Provide automatic dereferencing of array->column if inserts are done with multiple arrays.
     '''
 
+    def _makeTableProxy(self, table_name: str, fmt: dict):
+        return NumpyTableProxy(self, table_name, fmt)
+
     def reloadTables(self):
         '''
         Loads and parses the details of all tables from sqlite_master.
@@ -132,8 +183,7 @@ class NumpyCommonMethodMixin(CommonMethodMixin):
         results = self.cur.fetchall()
         self._tables.clear()
         for result in results:
-            self._tables[result[0]] = NumpyTableProxy(self, result[0],
-                                                       FormatSpecifier.fromSql(result[1]).generate())
+            self._tables[result[0]] = NumpyTableProxy(self, result[0], self._parseSchema(result[1]))
             
         return results
 
@@ -228,23 +278,93 @@ class NumpyTableProxy(TableProxy):
 
         return r
 
-    def _numpyParseInserts(self, *args):
+    # Fallback dtypes for columns without a numpy suffix, from the column's python type hint
+    typehintDtypes = {
+        int: np.int64,
+        float: np.float64,
+        (int, float): np.float64
+    }
+
+    def selectAsArrays(self,
+                       columnNames: list,
+                       conditions: list=None,
+                       orderBy: list=None):
         '''
-        Helper method to cast numpy arrays during inserts.
-        This is mainly to ensure that sqlite can read the types,
-        since it bugs out when the size is not "common".
-        Example: 
-            float32 will not be read in correctly, so it must be cast to float64.
+        Performs a select and returns the results directly as one numpy array per column.
+        This is much faster than select() followed by fetchAsNumpy(), as rows are fetched as plain tuples
+        in one call, transposed in C and converted to arrays column by column, instead of row by row.
+
+        The dtype comes from the column's suffix if it has one (see numpyColumnSuffixes),
+        otherwise from its sql type (INTEGER -> int64, REAL -> float64); anything else is
+        returned as an object array. Expressions that aren't columns (e.g. "count(*)") are left to numpy.
+        Columns that can't be converted to their dtype, e.g. because they contain NULLs, are returned
+        as object arrays of the raw values.
+
+        Parameters
+        ----------
+        columnNames : list
+            List of columns to extract. A single column may be specified as a string.
+            If all columns are desired, the string "*" may be specified.
+        conditions : list, optional
+            The filter conditions placed after "where". See select().
+        orderBy : list, optional
+            The ordering conditions placed after "order by". See select().
+
+        Returns
+        -------
+        r : dict
+            Column name -> numpy array.
         '''
-        if hasattr(args[0], "__next__"): # Self-inputted generator is not allowed here
-            raise TypeError("For numpy databases, pass in the individual arrays directly instead of your own generators.")
+        if isinstance(columnNames, str):
+            columnNames = self.columnNames if columnNames == "*" else [columnNames]
+        stmt = self._makeSelectStatement(columnNames, self._tbl, conditions, orderBy)
 
-        length = args[0].size # They must all be the same length anyway
-        _args = (
-            [args[i][j] for i in range(len(args))]
-            for j in range(length)
-        )
-        return _args
+        # Use a separate cursor, without a row factory, so we don't disturb the parent cursor
+        cur = self._parent.con.cursor()
+        cur.row_factory = None
+        rows = cur.execute(stmt).fetchall()
+        cols = zip(*rows) if len(rows) > 0 else ((),) * len(columnNames)
+
+        r = dict()
+        for name, col in zip(columnNames, cols):
+            dtype = self._getNumpyTypeFromSuffix(name)
+            if dtype is None:
+                column = self._cols.get(name)
+                if column is not None:
+                    dtype = self.typehintDtypes.get(column.typehint, object)
+            try:
+                if dtype is not None and dtype is not object and len(col) > 0 and col[0].__class__ is bytes:
+                    # Stored as raw bytes on insert, so the whole column is a single buffer
+                    r[name] = np.frombuffer(b''.join(col), dtype=dtype)
+                else:
+                    r[name] = np.array(col, dtype=dtype)
+            except (TypeError, ValueError):
+                # Not homogeneous e.g. NULLs, or a mix of bytes and numbers
+                r[name] = np.array(col, dtype=object)
+        return r
+
+    def _numpyParseInserts(self, *args):
+        '''
+        Helper method to convert numpy arrays into lists of insertable values, one list per array.
+        float64 (and string/object) elements become the equivalent python objects.
+        All other types are stored as blobs of their raw bytes, exactly as sqlite stores a single
+        numpy scalar of that type; fetchAsNumpy() decodes these with the column suffix's dtype.
+        Each conversion is a single C loop, rather than indexing out a numpy scalar per element.
+        '''
+        cols = []
+        for arr in args:
+            # Arrays (the usual case) skip the checks entirely
+            if arr.__class__ is not np.ndarray:
+                if isinstance(arr, Iterator): # Self-inputted generator is not allowed here
+                    raise TypeError("For numpy databases, pass in the individual arrays directly instead of your own generators.")
+                arr = np.asarray(arr)
+            arr = arr.reshape(-1)
+            if (arr.dtype.kind == 'f' and arr.dtype.itemsize == 8) or arr.dtype.kind in 'OUS':
+                cols.append(arr.tolist())
+            else:
+                # View each element as an opaque block of bytes; tolist() then gives bytes objects
+                cols.append(np.ascontiguousarray(arr).view('V%d' % arr.dtype.itemsize).tolist())
+        return cols
 
     def insertOne(self, *args, **kwargs):
         raise NotImplementedError("For numpy databases, you can only pass in numpy arrays via insertMany. Length one arrays are allowed there.")
@@ -284,11 +404,9 @@ class NumpyTableProxy(TableProxy):
 
         '''
 
-        # Make the generator
-        _args = self._numpyParseInserts(*args)
-
-        # Everything else is the same
-        stmt = super().insertMany(_args, orReplace=orReplace, commitNow=commitNow)
+        # Convert each array in bulk, then bind them as whole columns
+        cols = self._numpyParseInserts(*args)
+        stmt = self._insertColumnLists(cols, orReplace=orReplace, commitNow=commitNow)
         
         return stmt
 
@@ -48,6 +48,53 @@ class TestBlobInterpreter(unittest.TestCase):
         for k in self.data:
             self.assertEqual(interpreted[k], self.data[k])
 
+    #%%
+    def test_interpret_buffers(self):
+        p = sew.blobInterpreter.BlobInterpreter(
+            [('p1', 'u8'), ('p2', 'i64'), ('p3', 'f64')]
+        )
+        self.d[self.tablename].select("*")
+        result = self.d.fetchone()['data']
+
+        # Other buffer types give the same result
+        for blob in (bytearray(result), memoryview(result), np.frombuffer(result, np.uint8)):
+            interpreted = p.interpret(blob)
+            for k in self.data:
+                self.assertEqual(interpreted[k], self.data[k])
+                self.assertEqual(interpreted[k].dtype, self.data[k].dtype)
+
+    #%%
+    def test_interpretMany(self):
+        p = sew.blobInterpreter.BlobInterpreter(
+            [('p1', 'u8'), ('p2', 'i64'), ('p3', 'f64')]
+        )
+        # Add a second row
+        second = np.array([4], np.uint8).tobytes() + np.array([-5], np.int64).tobytes() + np.array([0.5]).tobytes()
+        self.d[self.tablename].insertOne(second, commitNow=True)
+        self.d[self.tablename].select("*")
+        blobs = [row['data'] for row in self.d.fetchall()]
+
+        arr = p.interpretMany(blobs)
+        self.assertEqual(arr.shape, (2,))
+        np.testing.assert_array_equal(arr['p1'], [3, 4])
+        np.testing.assert_array_equal(arr['p2'], [123, -5])
+        np.testing.assert_array_equal(arr['p3'], [1142.2, 0.5])
+
+        with self.assertRaises(ValueError):
+            p.interpretMany([blobs[0], blobs[1][:-1]])
+
+    #%%
+    def test_interpret_repeated_descriptors(self):
+        # As before, the last field with a repeated descriptor wins
+        p = sew.blobInterpreter.BlobInterpreter([('x', 'u8'), ('x', 'u8')])
+        interpreted = p.interpret(bytes([2, 1]))
+        self.assertEqual(list(interpreted.keys()), ['x'])
+        np.testing.assert_array_equal(interpreted['x'], [1])
+
+        # But they can't be interpreted into a structured array
+        with self.assertRaises(ValueError):
+            p.interpretMany([bytes([2, 1])])
+
     #%%
     def test_interpret_config(self):
         # Construct interpreter from config file
@@ -4,6 +4,10 @@ from ._helpers import *
 import unittest
 import sqlite3 as sq
 import numpy as np
+import pandas as pd
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 #%%
 class TestCorrectness(unittest.TestCase):
@@ -44,6 +48,51 @@ class TestCorrectness(unittest.TestCase):
         self.assertNotIn("tbl", self.d.tables)
 
 
+    #%%
+    def test_createTable_matches_reload(self):
+        # The format cached at creation should match what is parsed back from sqlite_master
+        fmt = self.fmtspec.generate()
+        self.assertEqual(self.d['correctness']._fmt['cols'], fmt['cols'])
+        self.assertEqual(self.d['correctness']._fmt['conds'], fmt['conds'])
+        # And is a copy, not the caller's dictionary
+        self.assertIsNot(self.d['correctness']._fmt['cols'], fmt['cols'])
+
+        self.d.reloadTables()
+        self.assertEqual(self.d['correctness']._fmt['cols'], fmt['cols'])
+        self.assertEqual(self.d['correctness']._fmt['conds'], fmt['conds'])
+
+    #%%
+    def test_reloadTables_schema_cache(self):
+        self.d.reloadTables()
+        fmt = self.d['correctness']._fmt
+        self.d.reloadTables()
+        self.assertIs(self.d['correctness']._fmt, fmt) # Parsed once, then reused
+        self.assertGreater(len(self.d._schemaCache), 0)
+
+        self.d.dropTable('correctness')
+        self.assertEqual(len(self.d._schemaCache), 0)
+
+    #%%
+    def test_columns_are_lazy(self):
+        self.d.reloadTables()
+        self.assertNotIn('_cols', self.d['correctness'].__dict__)
+        self.assertEqual(self.d['correctness'].columnNames, ['col1', 'col2', 'col3'])
+        self.assertIn('_cols', self.d['correctness'].__dict__)
+
+        # Unknown column types only raise once the columns are used
+        self.d.createTable({'cols': [['c1', 'datetime']], 'conds': []}, 'unknowntypes')
+        with self.assertRaises(NotImplementedError):
+            self.d['unknowntypes'].columns
+
+        # Type hints are resolved from the prefix regardless of case
+        self.assertIs(sew.TableProxy._typehintFor('INTEGER'), int)
+        self.assertIs(sew.TableProxy._typehintFor('character(10)'), str)
+        self.assertIs(sew.TableProxy._typehintFor('Double'), float)
+        # Other declared types fall back to sqlite's affinity rules
+        self.assertIs(sew.TableProxy._typehintFor('VARCHAR(255)'), str)
+        self.assertIs(sew.TableProxy._typehintFor('bigint'), int)
+        self.assertIs(sew.TableProxy._typehintFor('single float'), float)
+
     #%%
     def test_formatSpecifier_getter(self):
         self.assertEqual(
@@ -51,6 +100,13 @@ class TestCorrectness(unittest.TestCase):
             self.d["correctness"].formatSpecifier
         )
 
+    #%%
+    def test_formatSpecifier_defaults(self):
+        # Instances don't share their default lists
+        fmtspec = sew.FormatSpecifier()
+        fmtspec.addColumn('c1', int)
+        self.assertEqual(len(sew.FormatSpecifier().fmt['cols']), 0)
+
     #%%
     def test_insert_simple_and_delete(self):
         rows = [(10.0, 20.0, 30.0), (30.0,40.0,50.0)]
@@ -96,6 +152,46 @@ class TestCorrectness(unittest.TestCase):
             self.assertEqual(data3[i], result[2])
 
 
+    #%%
+    def test_insertNumpy(self):
+        data1 = np.array([10.0, 30.0])
+        data2 = np.array([30.0, 40.0], dtype=np.float32)
+        data3 = np.array([50, 60])
+        self.d['correctness'].insertNumpy(
+            data1, data2, data3, commitNow=True
+        )
+        self.d['correctness'].select("*")
+        results = self.d.fetchall()
+        self.assertEqual(len(results), 2)
+        for i, result in enumerate(results):
+            self.assertEqual(data1[i], result[0])
+            self.assertEqual(data2[i], result[1])
+            self.assertEqual(data3[i], result[2])
+
+        # Enough rows to need several batched statements, plus a remainder
+        length = 1000
+        data = np.random.rand(3, length)
+        self.d['correctness'].delete("1=1")
+        self.d['correctness'].insertNumpy(*data, commitNow=True)
+        self.d['correctness'].select("*", orderBy="rowid")
+        results = self.d.fetchall()
+        self.assertEqual(len(results), length)
+        for i, result in enumerate(results):
+            self.assertEqual(tuple(result), tuple(data[:,i]))
+
+        with self.assertRaises(ValueError):
+            self.d['correctness'].insertNumpy(data1, data2, data3[:1])
+
+        # A failure in a later batch leaves nothing from the call behind, with or without commitNow
+        data = np.random.rand(3, length)
+        data[:, -1] = data[:, 0] # Violates UNIQUE(col1, col2) in the last batch
+        for commitNow in (True, False):
+            with self.assertRaises(sq.IntegrityError):
+                self.d['correctness'].insertNumpy(*data, commitNow=commitNow)
+            self.assertFalse(self.d.con.in_transaction)
+            self.d['correctness'].select("*")
+            self.assertEqual(len(self.d.fetchall()), length)
+
     #%%
     def test_create_metadata(self):
         # First check that it throws if tablename or columns are wrong
@@ -143,6 +239,8 @@ class TestCorrectness(unittest.TestCase):
             metadata,
             "tbl_metadata"
         )
+        # The caller's list is left alone
+        self.assertListEqual(metadata, [5, 0.2])
 
         # Check the list of data tables associated with this metadata table
         datatables = self.d['tbl_metadata'].getDataTables()
@@ -156,14 +254,33 @@ class TestCorrectness(unittest.TestCase):
             'mydata_table'
         )
         self.assertListEqual(
-            metadata,
+            ["mydata_table"] + metadata,
             [i for i in metadataresult]
         )
 
+        # Repeated lookups are cached, until something is written
+        self.assertIs(self.d['tbl_metadata'].getMetadataFor('mydata_table'), metadataresult)
+        self.d.execute("update tbl_metadata set setting1=6 where data_tblname='mydata_table'")
+        self.assertEqual(self.d['tbl_metadata'].getMetadataFor('mydata_table')['setting1'], 6)
+        self.d.execute("update tbl_metadata set setting1=5 where data_tblname='mydata_table'")
+
+        # Or rolled back, which doesn't move total_changes back
+        self.d.commit()
+        with self.assertRaises(ZeroDivisionError):
+            with self.d.transaction():
+                self.d.execute("update tbl_metadata set setting1=7 where data_tblname='mydata_table'")
+                self.assertEqual(self.d['tbl_metadata'].getMetadataFor('mydata_table')['setting1'], 7)
+                1/0
+        self.assertEqual(self.d['tbl_metadata'].getMetadataFor('mydata_table')['setting1'], 5)
+        self.d.execute("update tbl_metadata set setting1=7 where data_tblname='mydata_table'")
+        self.assertEqual(self.d['tbl_metadata'].getMetadataFor('mydata_table')['setting1'], 7)
+        self.d.rollback()
+        self.assertEqual(self.d['tbl_metadata'].getMetadataFor('mydata_table')['setting1'], 5)
+
         # Also check that we can retrieve it from the data table
         metadataresultFromDataTable = self.d['mydata_table'].getMetadata()
         self.assertListEqual(
-            metadata,
+            ["mydata_table"] + metadata,
             [i for i in metadataresultFromDataTable]
         )
 
@@ -177,6 +294,66 @@ class TestCorrectness(unittest.TestCase):
             sew.DataTableProxy
         )
 
+        # A failed create rolls back its metadata row too
+        self.d.commit()
+        with self.assertRaises(sq.OperationalError):
+            self.d.createDataTable(
+                self.fmtspec.generate(),
+                "correctness",
+                [6, 0.3],
+                "tbl_metadata",
+                commitNow=True
+            )
+        self.assertListEqual(
+            self.d['tbl_metadata'].getDataTables(),
+            ["mydata_table"]
+        )
+
+        # Also when joining an already open transaction, which is left intact
+        self.d['mydata_table'].insertOne(7.0, 8.0, 9.0)
+        self.assertTrue(self.d.con.in_transaction)
+        with self.assertRaises(sq.OperationalError):
+            self.d.createDataTable(
+                self.fmtspec.generate(),
+                "mydata_table",
+                [2, 0.4],
+                "tbl_metadata"
+            )
+        self.assertTrue(self.d.con.in_transaction)
+        self.assertListEqual(
+            self.d['tbl_metadata'].getDataTables(),
+            ["mydata_table"]
+        )
+        self.d['mydata_table'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 1)
+
+        # commitNow still commits the open transaction, as before
+        self.d.createDataTable(
+            self.fmtspec.generate(),
+            "mydata_table2",
+            [3, 0.5],
+            "tbl_metadata",
+            commitNow=True
+        )
+        self.assertFalse(self.d.con.in_transaction)
+        self.d.dropTable("mydata_table2")
+        self.d['tbl_metadata'].delete("data_tblname='mydata_table2'", commitNow=True)
+
+        # Reloading restores the data table upgrade
+        self.d.reloadTables()
+        self.assertIsInstance(self.d['mydata_table'], sew.DataTableProxy)
+        self.assertEqual(self.d['mydata_table']._metadatatable, "tbl_metadata")
+        self.assertEqual(
+            list(self.d._tables.keys()), ["correctness", "tbl_metadata", "mydata_table"])
+
+        # Also when the metadata table comes after its data table
+        self.d.createTable(self.fmtspec.generate(), "early_data")
+        self.d.createMetaTable(metaFmtspec.generate(), "late_metadata")
+        self.d['late_metadata'].insertOne("early_data", 1, 0.5, commitNow=True)
+        self.d.reloadTables()
+        self.assertIsInstance(self.d['early_data'], sew.DataTableProxy)
+        self.assertEqual(self.d['early_data'].metadataTablename, "late_metadata")
+
     #%%
     def test_redirect(self):
         self.assertEqual(
@@ -199,6 +376,38 @@ class TestCorrectness(unittest.TestCase):
             stmt2, "select col1,col2 from tablename where col1 > ? and col2 > ? order by col1 desc",
             "select statement with conditions and ordering is incorrect"
         )
+        # Tuples are accepted just like lists
+        stmt3 = self.d._makeSelectStatement(tuple(columnNames), tablename, tuple(conditions), ("col1 desc", "col2 asc"))
+        self.assertEqual(
+            stmt3, 'select col1,col2 from "tablename" where col1 > ? and col2 > ? order by col1 desc,col2 asc'
+        )
+        # Single column and "*" strings pass through untouched
+        self.assertEqual(self.d._makeSelectStatement("*", tablename), 'select * from "tablename"')
+        # Including str subclasses
+        self.assertEqual(self.d._makeSelectStatement(np.str_("col1"), tablename), 'select col1 from "tablename"')
+        self.d['correctness'].insertOne(1.0, 2.0, 3.0)
+        self.d['correctness'].select(np.str_("col1"))
+        self.assertEqual(self.d.fetchone()[0], 1.0)
+        self.assertEqual(
+            self.d._makeSelectStatement("*", tablename, np.str_("col1>1"), np.str_("col1")),
+            'select * from "tablename" where col1>1 order by col1')
+        self.d['correctness'].select("*", np.str_("col1>0"), np.str_("col1"))
+        self.assertEqual(len(self.d.fetchall()), 1)
+        self.d['correctness'].delete(np.str_("col1>0"))
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 0)
+
+    #%%
+    def test_stitchConditions(self):
+        self.assertEqual(self.d._stitchConditions(None), '')
+        self.assertEqual(self.d._stitchConditions("col1 > 0"), self.d._stitchConditionsStr("col1 > 0"))
+        self.assertEqual(self.d._stitchConditions(["col1 > 0", "col2 < 1"]), ' where col1 > 0 and col2 < 1')
+        self.assertEqual(self.d._stitchConditionsList(("col1 > 0", "col2 < 1")), ' where col1 > 0 and col2 < 1')
+
+    #%%
+    def test_makeQuestionMarks(self):
+        for n in (0, 1, 3, 64, 128, 129, 200, 200):
+            self.assertEqual(self.d._makeQuestionMarks(n), ','.join(["?"] * n))
 
     #%%
     def test_uniqueness_throws(self):
@@ -220,6 +429,131 @@ class TestCorrectness(unittest.TestCase):
                 0.
             )
 
+        # Rows with too few and too many values in the same batch should not offset each other
+        rows = [(i, i+1, i+2) for i in range(1000)]
+        rows[10] = (10, 11)
+        rows[11] = (11, 12, 13, 14)
+        with self.assertRaises(sq.ProgrammingError):
+            self.d['correctness'].insertMany(rows)
+
+    #%%
+    def test_insertRange(self):
+        self.d['correctness'].insertRange(["value", "value+1", "value*0.5"], 5, commitNow=True)
+        self.d['correctness'].select("*", orderBy="col1 asc")
+        results = self.d.fetchall()
+        self.assertEqual([tuple(r) for r in results],
+                         [(i, i+1, i*0.5) for i in range(5)])
+
+        # Nothing is inserted for n = 0
+        self.d['correctness'].insertRange(["value", "value", "value"], 0)
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 5)
+
+        with self.assertRaises(ValueError):
+            self.d['correctness'].insertRange(["value"], 5)
+
+    #%%
+    def test_insertMany_batches(self):
+        length = 1000 # Spans several batched statements, plus a remainder
+        self.d['correctness'].insertMany(
+            ((i, i+1, i+2) for i in range(length)), commitNow=True
+        )
+        self.d['correctness'].select("*", orderBy="rowid")
+        results = self.d.fetchall()
+        self.assertEqual(len(results), length)
+        for i, result in enumerate(results):
+            self.assertEqual(tuple(result), (i, i+1, i+2))
+
+    #%%
+    def test_insertMany_numpy_rows(self):
+        # 2-D arrays and structured arrays are accepted as rows directly
+        arr = np.arange(12, dtype=np.float64).reshape((4, 3))
+        self.d['correctness'].insertMany(arr)
+        structured = np.zeros(2, dtype=[('a', np.float64), ('b', np.float64), ('c', np.float64)])
+        structured['a'] = [100.0, 200.0]
+        self.d['correctness'].insertMany(structured, commitNow=True)
+
+        self.d['correctness'].select("*", orderBy="rowid")
+        results = [tuple(row) for row in self.d.fetchall()]
+        self.assertEqual(results[:4], [tuple(row) for row in arr.tolist()])
+        self.assertEqual(results[4:], [(100.0, 0.0, 0.0), (200.0, 0.0, 0.0)])
+        self.assertIs(type(results[0][0]), float)
+
+    #%%
+    def test_transaction(self):
+        # Exceptions roll back everything inside the transaction
+        with self.assertRaises(sq.IntegrityError):
+            with self.d.transaction():
+                self.d['correctness'].insertOne(1.0, 2.0, 3.0)
+                self.d['correctness'].insertOne(1.0, 2.0, 3.0)
+        self.assertFalse(self.d.con.in_transaction)
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 0)
+
+        # Successful transactions are committed
+        with self.d.transaction():
+            self.d['correctness'].insertOne(1.0, 2.0, 3.0)
+        self.assertFalse(self.d.con.in_transaction)
+
+        # insertMany with commitNow is atomic
+        with self.assertRaises(sq.IntegrityError):
+            self.d['correctness'].insertMany(
+                [(5.0, 6.0, 7.0), (1.0, 2.0, 3.0)], commitNow=True
+            )
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 1)
+
+        # Without commitNow, a failed insertMany is still rolled back as a whole
+        with self.assertRaises(sq.IntegrityError):
+            self.d['correctness'].insertMany(
+                [(5.0, 6.0, 7.0), (1.0, 2.0, 3.0)]
+            )
+        self.assertFalse(self.d.con.in_transaction)
+        # But a successful one is left uncommitted
+        self.d['correctness'].insertMany([(5.0, 6.0, 7.0)])
+        self.assertTrue(self.d.con.in_transaction)
+        self.d.rollback()
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 1)
+
+        # Inside an already open transaction, a failed insertMany only rolls back its own rows,
+        # even across several multi-row statements
+        self.d['correctness'].insertOne(8.0, 9.0, 10.0)
+        with self.assertRaises(sq.IntegrityError):
+            self.d['correctness'].insertMany(
+                [(100.0 + i, 0.0, 0.0) for i in range(1200)] + [(1.0, 2.0, 3.0)]
+            )
+        self.assertTrue(self.d.con.in_transaction)
+        self.d.commit()
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 2)
+
+        # Joined transactions roll back only their own block
+        self.d['correctness'].insertOne(11.0, 12.0, 13.0)
+        with self.assertRaises(ZeroDivisionError):
+            with self.d.transaction():
+                self.d['correctness'].insertOne(14.0, 15.0, 16.0)
+                1/0
+        self.assertTrue(self.d.con.in_transaction)
+        self.d.commit()
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 3)
+
+    #%%
+    def test_transaction_immediate(self):
+        # An immediate transaction holds the write lock from the start
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "immediate.db")
+            with sew.Database(path) as d:
+                d.createTable(self.fmtspec.generate(), 'correctness', commitNow=True)
+                other = sq.connect(path, timeout=0)
+                with d.transaction(immediate=True):
+                    with self.assertRaises(sq.OperationalError):
+                        other.execute("BEGIN IMMEDIATE")
+                other.execute("BEGIN IMMEDIATE")
+                other.rollback()
+                other.close()
+
     #%%
     def test_insertOne_throws_if_enclosed(self):
         with self.assertRaises(TypeError):
@@ -241,6 +575,12 @@ class TestCorrectness(unittest.TestCase):
         self.assertEqual(result['col2'], None)
         self.assertEqual(result['col3'], 44.0)
 
+        # Same keys reuse the cached statement; a different key order is a different statement
+        stmt2 = self.d['correctness'].insertOne({'col1': 1.0, 'col3': 2.0})
+        self.assertIs(stmt, stmt2)
+        stmt3 = self.d['correctness'].insertOne({'col3': 3.0, 'col1': 4.0})
+        self.assertEqual(stmt3, 'insert into "correctness"(col3,col1) values(?,?)')
+
     #%%
     def test_makeCaseStatements(self):
         singlecase = self.d._makeCaseSingleConditionVariable(
@@ -291,6 +631,18 @@ class TestCorrectness(unittest.TestCase):
             self.assertEqual(result['col2'], None)
             self.assertEqual(result['col3'], dictlist[i]['col3'])
 
+        # A failing row rolls back the whole call
+        with self.assertRaises(KeyError):
+            self.d['correctness'].insertManyNamedColumns(
+                [{'col1': 1.0, 'col3': 2.0}, {'col1': 3.0}], commitNow=True)
+        self.d['correctness'].select("*")
+        self.assertEqual(len(self.d.fetchall()), 2)
+
+        # A single named column
+        self.d['correctness'].insertManyNamedColumns([{'col2': 7.0}, {'col2': 8.0}])
+        self.d['correctness'].select("col2", "col2 > 6")
+        self.assertEqual([row[0] for row in self.d.fetchall()], [7.0, 8.0])
+
     #%%
     def test_createView(self):
         # Create a view with renames and amendments within select
@@ -456,6 +808,21 @@ class TestCorrectness(unittest.TestCase):
             self.assertEqual(result['id'], 1)
             self.assertEqual(result['val'], 2)
 
+        # Text keys are bound, so they don't need quoting
+        self.d.createTable({'cols': [['name', 'TEXT PRIMARY KEY']], 'conds': []}, 'tparent')
+        self.d.createTable(
+            {'cols': [['pname', 'TEXT']], 'conds': [], 'foreign_keys': [['pname', 'tparent(name)']]},
+            'tchild')
+        self.d['tparent'].insertOne("it's")
+        self.d['tchild'].insertOne("it's", commitNow=True)
+        self.d['tchild'].select("*")
+        stmt = self.d['tchild'].retrieveParentRow(self.d.fetchone())
+        self.assertEqual(self.d.fetchone()['name'], "it's")
+        self.assertIn("name=?", stmt)
+
+        with self.assertRaises(KeyError):
+            self.d['tparent'].retrieveParentRow(None)
+
     #%%
     def test_multiple_foreignkeys(self):
          # Create a parent table
@@ -562,6 +929,19 @@ class TestCorrectness(unittest.TestCase):
             ]
         )
         self.d.createTable(childfmt23.generate(), "child23")
+        # Created tables are registered immediately, the same as after a reload
+        self.assertIn(("child23", "col2"), self.d.relationships[("parent2", "id")])
+        createdRelations = {k: sorted(v) for k, v in self.d.relationships.items()}
+        self.d.reloadTables()
+        self.assertEqual({k: sorted(v) for k, v in self.d.relationships.items()}, createdRelations)
+
+        # Keys that only name the parent table can still be created; like reloadTables, they are skipped
+        self.d.createTable(
+            {'cols': [['x', 'INTEGER']], 'conds': [], 'foreign_keys': [['x', 'parent1']]},
+            "childimplicit")
+        self.assertIn("childimplicit", self.d.tables)
+        self.assertNotIn(("childimplicit", "x"), self.d.relationships[("parent1", "id")])
+        self.d.dropTable("childimplicit")
 
         self.d.reloadTables()
 
@@ -589,6 +969,21 @@ class TestCorrectness(unittest.TestCase):
             ("child23", "col1") in families[("parent3", "id")]
         )
 
+        # Reloading again rebuilds rather than appends
+        self.d.reloadTables()
+        self.assertEqual(
+            sorted(self.d.relationships[("parent3", "id")]),
+            [("child23", "col1"), ("child23", "col3")]
+        )
+
+        # Dropping tables removes their relationships
+        self.d.dropTable("child23")
+        self.assertNotIn(("parent3", "id"), self.d.relationships)
+        self.assertEqual(self.d.relationships[("parent2", "id")], [("child12", "col2")])
+        self.d.dropTable("child12")
+        self.d.dropTable("parent1")
+        self.assertEqual(self.d.relationships, {})
+
     #%%
     def test_table_bracket_access(self):
         self.d['correctness'].insertMany(
@@ -615,6 +1010,10 @@ class TestCorrectness(unittest.TestCase):
             self.assertEqual(result['col2'], i+6)
             self.assertEqual(result['col3'], i+7)
 
+        # Open-ended slices
+        self.assertEqual(len(self.d['correctness'][:3]), 3)
+        self.assertEqual([r['col1'] for r in self.d['correctness'][7:]], [7, 8, 9])
+
         # Test error if steps are provided
         with self.assertRaises(ValueError):
             self.d['correctness'][2:7:2]
@@ -633,6 +1032,26 @@ class TestCorrectness(unittest.TestCase):
         self.assertIs(container.col1, table.columns['col1'])
         self.assertIs(container.col2, table.columns['col2'])
         self.assertIs(container.col3, table.columns['col3'])
+        with self.assertRaises(AttributeError):
+            container.col4
+        self.assertIn('col2', dir(container))
+
+    #%%
+    def test_column_proxy_comparisons(self):
+        col1 = self.d['correctness'].columns['col1'] # REAL
+        self.assertEqual(col1 < 1.5, "col1 < 1.5")
+        self.assertEqual(col1 <= 1.5, "col1 <= 1.5")
+        self.assertEqual(col1 > 1.5, "col1 > 1.5")
+        self.assertEqual(col1 >= 1.5, "col1 >= 1.5")
+        self.assertEqual(col1 == 1.5, "col1 = 1.5")
+        self.assertEqual(col1 != 1.5, "col1 != 1.5")
+        with self.assertRaises(TypeError):
+            col1 < "1.5"
+
+        # Cached per type, so equal values of different types keep their own form
+        col2 = sew.ColumnProxy('col2', (int, float))
+        self.assertEqual(col2 == 1, "col2 = 1")
+        self.assertEqual(col2 == 1.0, "col2 = 1.0")
 
     def test_context_manager(self):
         # Show that default sqlite3 doesn't close the database
@@ -650,6 +1069,262 @@ class TestCorrectness(unittest.TestCase):
         with self.assertRaises(sq.ProgrammingError):
             db.execute('create table x(c1 INT)')
 
+    #%%
+    def test_analyze(self):
+        self.d['correctness'].insertMany([(i, i, i) for i in range(100)], commitNow=True)
+        self.d.execute("create index idx_col1 on correctness(col1)")
+        self.d.analyze("correctness")
+        self.d.execute("select tbl from sqlite_stat1")
+        self.assertIn("correctness", [row[0] for row in self.d.fetchall()])
+        # Should simply run
+        self.d.optimize()
+
+    #%%
+    def test_tuple_row_factory(self):
+        d = sew.Database(":memory:", row_factory=None)
+        d.createTable(self.fmtspec.generate(), "tuples")
+        d.reloadTables()
+        self.assertIn("tuples", d.tables)
+        d['tuples'].insertOne(1.0, 2.0, 3.0)
+        d['tuples'].select("*")
+        self.assertEqual(d.fetchone(), (1.0, 2.0, 3.0))
+
+    #%%
+    def test_attach(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with sew.Database(os.path.join(tmpdir, "other.db")) as other:
+                other.createTable(self.fmtspec.generate(), "othertable")
+                other['othertable'].insertOne(1.0, 2.0, 3.0, commitNow=True)
+
+            self.d['correctness'].insertOne(1.0, 5.0, 6.0, commitNow=True)
+            self.d.attach(os.path.join(tmpdir, "other.db"), "other")
+            self.assertEqual(self.d.attached, ["other"])
+            # Join across both databases on the same connection
+            self.d.execute('select c.col2, o.col2 from correctness c join other.othertable o on c.col1 = o.col1')
+            self.assertEqual(tuple(self.d.fetchone()), (5.0, 2.0))
+            self.assertNotIn("othertable", self.d.tables)
+
+            self.d.detach("other")
+            self.assertEqual(self.d.attached, [])
+
+    #%%
+    def test_raw(self):
+        self.d['correctness'].insertOne(1.0, 2.0, 3.0)
+        with self.d.raw():
+            self.d['correctness'].select("*")
+            self.assertEqual(self.d.fetchall(), [(1.0, 2.0, 3.0)])
+        self.d['correctness'].select("*")
+        self.assertIsInstance(self.d.fetchone(), sq.Row)
+
+    #%%
+    def test_pragmas(self):
+        d = sew.Database(":memory:", pragmas={"cache_size": -1024, "temp_store": "MEMORY"})
+        d.execute("PRAGMA cache_size")
+        self.assertEqual(d.fetchone()[0], -1024)
+        d.execute("PRAGMA temp_store")
+        self.assertEqual(d.fetchone()[0], 2) # 2 is MEMORY
+        d.execute("PRAGMA busy_timeout")
+        self.assertEqual(d.fetchone()[0], int(sew.Database.busyTimeout * 1000))
+
+    #%%
+    def test_file_pragmas(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # File databases default to WAL and synchronous=NORMAL
+            with sew.Database(os.path.join(tmpdir, "wal.db")) as d:
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "wal")
+                d.execute("PRAGMA synchronous")
+                self.assertEqual(d.fetchone()[0], 1) # 1 is NORMAL
+                d.execute("PRAGMA page_size")
+                self.assertEqual(d.fetchone()[0], sew.Database.defaultPageSize)
+                d.createTable(self.fmtspec.generate(), "correctness", commitNow=True)
+
+            # Page size is only set on new files
+            with sew.Database(os.path.join(tmpdir, "wal.db"), page_size=4096) as d:
+                d.execute("PRAGMA page_size")
+                self.assertEqual(d.fetchone()[0], sew.Database.defaultPageSize)
+
+            # Which can be overridden
+            with sew.Database(os.path.join(tmpdir, "delete.db"), journal_mode="DELETE",
+                              synchronous="FULL", cache_size_kib=1024, page_size=8192) as d:
+                d.execute("PRAGMA page_size")
+                self.assertEqual(d.fetchone()[0], 8192)
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "delete")
+                d.execute("PRAGMA synchronous")
+                self.assertEqual(d.fetchone()[0], 2) # 2 is FULL
+                d.execute("PRAGMA cache_size")
+                self.assertEqual(d.fetchone()[0], -1024)
+
+        # In-memory databases are left alone
+        self.d.execute("PRAGMA synchronous")
+        self.assertEqual(self.d.fetchone()[0], 2)
+
+    #%%
+    def test_file_pragmas_existing(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "existing.db")
+            con = sq.connect(path)
+            con.execute("create table t(x integer)")
+            con.execute("insert into t values(1)")
+            con.commit()
+            con.close()
+
+            # Existing databases keep their journal mode
+            with sew.Database(path) as d:
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "delete")
+                self.assertFalse(d.optimizeOnExit)
+
+            # And the defaults can be skipped entirely
+            with sew.Database(os.path.join(tmpdir, "plain.db"), default_pragmas=False) as d:
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "delete")
+                d.execute("PRAGMA synchronous")
+                self.assertEqual(d.fetchone()[0], 2)
+            with sew.Database(os.path.join(tmpdir, "nowal.db"), journal_mode=False) as d:
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "delete")
+
+            # Read-only connections can still open and read it
+            class ReadOnlyDatabase(sew.Database):
+                def _connect(self, **kwargs):
+                    path, self.dbpath = self.dbpath, f"file:{self.dbpath}?mode=ro"
+                    try:
+                        return super()._connect(uri=True, **kwargs)
+                    finally:
+                        self.dbpath = path
+
+            with ReadOnlyDatabase(path) as d:
+                d.execute("select * from t")
+                self.assertEqual(d.fetchone()[0], 1)
+            # Empty files count as new, so the default WAL switch is attempted but skipped
+            emptyPath = os.path.join(tmpdir, "empty.db")
+            open(emptyPath, "wb").close()
+            with ReadOnlyDatabase(emptyPath) as d:
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "delete")
+
+    #%%
+    def test_threadConnection(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with sew.Database(os.path.join(tmpdir, "threads.db")) as d:
+                d.createTable(self.fmtspec.generate(), "correctness")
+                d['correctness'].insertMany([(i, i+1, i+2) for i in range(100)], commitNow=True)
+                self.assertIs(d.threadConnection(), d.con)
+
+                def work(_):
+                    con = d.threadConnection()
+                    rows = con.execute('select col1 from "correctness"').fetchall()
+                    return id(con), len(rows), con is d.threadConnection()
+
+                with ThreadPoolExecutor(4) as pool:
+                    results = list(pool.map(work, range(8)))
+                for conid, nrows, reused in results:
+                    self.assertNotEqual(conid, id(d.con))
+                    self.assertEqual(nrows, 100)
+                    self.assertTrue(reused)
+
+        # In-memory databases can't be shared
+        with ThreadPoolExecutor(1) as pool:
+            with self.assertRaises(ValueError):
+                pool.submit(self.d.threadConnection).result()
+
+    #%%
+    def test_executeAsync(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with sew.Database(os.path.join(tmpdir, "async.db")) as d:
+                d.createTable(self.fmtspec.generate(), "correctness", commitNow=True)
+                stmt = d['correctness']._insertStmt
+
+                def produce(k):
+                    for i in range(50):
+                        d.executeAsync(stmt, (k, i, 0.0))
+
+                with ThreadPoolExecutor(4) as pool:
+                    list(pool.map(produce, range(4)))
+                d.flushAsync()
+                d['correctness'].select("*")
+                self.assertEqual(len(d.fetchall()), 200)
+
+                # Failures roll back their batch and surface on flush
+                d.executeAsync(stmt, (0, 0, 0.0)) # Violates the unique constraint
+                with self.assertRaises(sq.IntegrityError):
+                    d.flushAsync()
+                d.flushAsync() # The error is only raised once
+
+                # Anything still queued is committed when stopping
+                d.executeAsync(stmt, (10, 0, 0.0))
+                d.stopAsyncWriter()
+                d['correctness'].select("*")
+                self.assertEqual(len(d.fetchall()), 201)
+
+                # Stopping while producers are still queueing doesn't strand any writes
+                def produceAndStop(k):
+                    for i in range(50):
+                        d.executeAsync(stmt, (20 + k, i, 0.0))
+                        if i % 10 == 0:
+                            d.stopAsyncWriter()
+
+                with ThreadPoolExecutor(4) as pool:
+                    list(pool.map(produceAndStop, range(4)))
+                d.flushAsync()
+                d['correctness'].select("*")
+                self.assertEqual(len(d.fetchall()), 401)
+
+                # Committed batches invalidate cached metadata
+                d.createMetaTable(
+                    sew.FormatSpecifier([["data_tblname", "TEXT"], ["setting1", "INT"]]).generate(),
+                    "async_metadata", commitNow=True)
+                d.createDataTable(self.fmtspec.generate(), "async_data", [1], "async_metadata", commitNow=True)
+                self.assertEqual(d['async_metadata'].getMetadataFor('async_data')['setting1'], 1)
+                d.executeAsync("update async_metadata set setting1=2")
+                d.flushAsync()
+                self.assertEqual(d['async_metadata'].getMetadataFor('async_data')['setting1'], 2)
+
+            # close() also commits anything still queued
+            d = sew.Database(os.path.join(tmpdir, "async.db"))
+            d.executeAsync(stmt, (30, 0, 0.0))
+            d.close()
+            with sew.Database(os.path.join(tmpdir, "async.db")) as d:
+                d['correctness'].select("*")
+                self.assertEqual(len(d.fetchall()), 402)
+
+        with self.assertRaises(ValueError):
+            self.d.executeAsync("select 1")
+
+    #%%
+    def test_bulkInsertContext(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with sew.Database(os.path.join(tmpdir, "bulk.db")) as d:
+                d.createTable(self.fmtspec.generate(), "correctness")
+                with d.bulkInsertContext():
+                    d.execute("PRAGMA journal_mode")
+                    self.assertEqual(d.fetchone()[0], "memory")
+                    d['correctness'].insertMany(
+                        [(i, i+1, i+2) for i in range(10)]
+                    )
+                self.assertFalse(d.con.in_transaction)
+                d.execute("PRAGMA journal_mode")
+                self.assertEqual(d.fetchone()[0], "wal")
+                d['correctness'].select("*")
+                self.assertEqual(len(d.fetchall()), 10)
+
+                # Failures are rolled back cleanly
+                with self.assertRaises(sq.IntegrityError):
+                    with d.bulkInsertContext():
+                        d['correctness'].insertMany([(100, 101, 102)])
+                        d['correctness'].insertMany([(0, 1, 2)])
+                d['correctness'].select("*")
+                self.assertEqual(len(d.fetchall()), 10)
+
+                # Pending transactions are not silently committed
+                d['correctness'].insertOne(200, 201, 202)
+                with self.assertRaises(ValueError):
+                    with d.bulkInsertContext():
+                        pass
+                d.rollback()
+
 
 
     #%% ==================================== PLUGINS ==================================== #
@@ -681,6 +1356,79 @@ class TestCorrectness(unittest.TestCase):
         np.testing.assert_equal(data_f64, results['col1_f64'])
         np.testing.assert_equal(data_f32, results['col2_f32'])
 
+        # A failure in a later batch rolls back the whole call
+        nd.createTable(
+            sew.FormatSpecifier([["col1_f64", "real"]], ["UNIQUE(col1_f64)"]).generate(),
+            "uniquetable"
+        )
+        data = np.arange(3000, dtype=np.float64)
+        data[-1] = 0.0
+        with self.assertRaises(sq.IntegrityError):
+            nd['uniquetable'].insertMany(data, commitNow=True)
+        self.assertFalse(nd.con.in_transaction)
+        nd['uniquetable'].select("*")
+        self.assertEqual(len(nd.fetchall()), 0)
+
+        with self.assertRaises(ValueError):
+            nd['uniquetable'].insertMany()
+
+    #%%
+    def test_numpy_plugin_storage(self):
+        data_i32 = np.arange(2000, dtype=np.int32)
+        data_f64 = np.random.randn(2000)
+
+        nd = sew.plugins.NumpyDatabase(":memory:")
+        nd.createTable(
+            sew.FormatSpecifier([["col1_i32", "integer"], ["col2_f64", "real"]]).generate(),
+            "nptable"
+        )
+        nd['nptable'].insertMany(data_i32, data_f64, commitNow=True)
+
+        # Non-python types are stored as raw bytes, the same as binding a numpy scalar directly
+        nd.execute('select col1_i32, typeof(col1_i32), typeof(col2_f64) from nptable limit 1 offset 5')
+        row = nd.fetchone()
+        self.assertEqual(row[0], data_i32[5].tobytes())
+        self.assertEqual(row[1], "blob")
+        self.assertEqual(row[2], "real")
+
+        nd['nptable'].select("*")
+        results = nd['nptable'].fetchAsNumpy()
+        np.testing.assert_equal(data_i32, results['col1_i32'][:2000])
+        np.testing.assert_equal(data_f64, results['col2_f64'][:2000])
+
+        # Columnar selects give the same arrays, with the suffix dtypes
+        results = nd['nptable'].selectAsArrays("*")
+        self.assertEqual(results['col1_i32'].dtype, np.int32)
+        np.testing.assert_equal(data_i32, results['col1_i32'])
+        np.testing.assert_equal(data_f64, results['col2_f64'])
+        results = nd['nptable'].selectAsArrays("col2_f64", conditions="col2_f64 > 100")
+        self.assertEqual(results['col2_f64'].size, 0)
+
+        # Columns without a suffix use their sql type
+        nd.createTable(sew.FormatSpecifier([["a", "integer"], ["b", "text"]]).generate(), "plain")
+        nd['plain'].insertMany(np.arange(3), np.array(["x", "y", "z"]))
+        results = nd['plain'].selectAsArrays(["a", "b"], orderBy="a asc")
+        self.assertEqual(results['a'].dtype, np.int64)
+        self.assertEqual(results['b'].tolist(), ["x", "y", "z"])
+
+        # Expressions that aren't columns are left to numpy
+        results = nd['nptable'].selectAsArrays("count(*)")
+        self.assertEqual(results['count(*)'].tolist(), [len(data_i32)])
+
+        # NULLs fall back to object arrays of the raw values
+        nd.execute("insert into nptable(col2_f64) values(1.5)")
+        nd.execute("insert into plain(b) values('w')")
+        results = nd['nptable'].selectAsArrays("*", orderBy="rowid")
+        self.assertEqual(results['col1_i32'].dtype, object)
+        self.assertIsNone(results['col1_i32'][-1])
+        self.assertEqual(results['col1_i32'][0], data_i32[0].tobytes())
+        self.assertEqual(results['col2_f64'][-1], 1.5)
+        results = nd['plain'].selectAsArrays("a")
+        self.assertEqual(results['a'].dtype, object)
+        # Including str subclasses as the column name
+        results = nd['plain'].selectAsArrays(np.str_("b"), orderBy="b")
+        self.assertEqual(results['b'].tolist(), ["w", "x", "y", "z"])
+
     #%%
     def test_numpy_insertOne_throws(self):
         data_f64 = np.random.randn(1).astype(np.float64)
@@ -705,6 +1453,57 @@ class TestCorrectness(unittest.TestCase):
                 data_f64, data_f32, commitNow=True
             )
 
+        # Generators are rejected in any position
+        with self.assertRaises(TypeError):
+            nd['nptable'].insertMany(
+                data_f64, (x for x in data_f32)
+            )
+
+    #%%
+    def test_pandas_insertDataFrame(self):
+        pdd = sew.plugins.PandasDatabase(":memory:")
+        pdfmtspec = sew.FormatSpecifier(
+            [
+                ["col1", "integer"],
+                ["col2", "real"]
+            ],
+            ["UNIQUE(col1)"]
+        )
+        pdd.createTable(pdfmtspec.generate(), "pdtable")
+
+        # Enough rows to need several chunks
+        df = pd.DataFrame({'col1': np.arange(1000), 'col2': np.arange(1000) * 0.5})
+        pdd['pdtable'].insertDataFrame(df)
+        pdd['pdtable'].select("*", orderBy="col1 asc")
+        pd.testing.assert_frame_equal(pdd['pdtable'].pdresults, df)
+
+        # Replacing rows on the unique column
+        df2 = pd.DataFrame({'col2': [-1.0, -2.0], 'col1': [0, 999]}) # Matched by name, not position
+        pdd['pdtable'].insertDataFrame(df2, orReplace=True)
+        self.assertFalse(pdd.con.in_transaction)
+        pdd['pdtable'].select("*", conditions="col2 < 0", orderBy="col1 asc")
+        self.assertEqual(pdd['pdtable'].pdresults['col1'].tolist(), [0, 999])
+        pdd['pdtable'].select("*")
+        self.assertEqual(len(pdd['pdtable'].pdresults), 1000)
+
+        # Failures roll back the whole dataframe
+        df3 = pd.DataFrame({'col1': [2000, 0], 'col2': [1.0, 1.0]})
+        with self.assertRaises(sq.IntegrityError):
+            pdd['pdtable'].insertDataFrame(df3)
+        self.assertFalse(pdd.con.in_transaction)
+        pdd['pdtable'].select("*")
+        self.assertEqual(len(pdd['pdtable'].pdresults), 1000)
+
+        # Pending writes are neither committed nor rolled back by it
+        pdd['pdtable'].insertOne(500 + 1000, 1.0)
+        for orReplace in (False, True):
+            with self.assertRaises(ValueError):
+                pdd['pdtable'].insertDataFrame(df3, orReplace=orReplace)
+            self.assertTrue(pdd.con.in_transaction)
+        pdd.commit()
+        pdd['pdtable'].select("*")
+        self.assertEqual(len(pdd['pdtable'].pdresults), 1001)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file